@@ -0,0 +1,220 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+import numpy as np
+
+from ai.tokenizer import normalize_text
+
+
+def normalise_query(text: str) -> str:
+    return " ".join(normalize_text(text or "").split())
+
+
+def district_of(farmer_location: Optional[str], farmer_context: Optional[Dict[str, Any]] = None) -> str:
+    """District for cache partitioning; the Flask app sends ``"village, district"``."""
+    district = (farmer_context or {}).get("district") or ""
+    if not district and farmer_location:
+        district = farmer_location.rsplit(",", 1)[-1]
+    return district.strip().casefold()
+
+
+def answer_cache_key(query_text: str, language: str, crop_type: Optional[str], district: str) -> str:
+    parts = [normalise_query(query_text), language or "", (crop_type or "").strip().casefold(), district]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """Thread-safe LRU cache of generated answers with a TTL.
+
+    Bounded both by entry count and by the approximate size of the stored
+    values; the least recently used entries are evicted first. Each entry
+    remembers the knowledge-index generation it was produced from, and a
+    lookup against a different generation is treated as a miss.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 16 * 1024 * 1024, ttl: float = 86400.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, int, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def _sizeof(value: Dict[str, Any]) -> int:
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+
+    def get(self, key: str, generation: int = 0) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, gen, size, value = entry
+            if expires < now or gen != generation:
+                self._pop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Dict[str, Any], generation: int = 0) -> None:
+        if not self.enabled:
+            return
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.time() + self.ttl, generation, size, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _pop(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class _SemanticEntry:
+    __slots__ = ("ids", "weights", "context", "value", "expires")
+
+    def __init__(self, ids: np.ndarray, weights: np.ndarray, context: Tuple[str, ...],
+                 value: Dict[str, Any], expires: float):
+        self.ids = ids
+        self.weights = weights
+        self.context = context
+        self.value = value
+        self.expires = expires
+
+
+class SemanticCache:
+    """Near-duplicate answer cache over retriever query vectors.
+
+    Entries are partitioned by language and each partition is an LRU with its
+    own inverted index (term id -> entry keys), so a lookup only compares the
+    query against cached prompts that share at least one term. A hit needs
+    cosine similarity >= ``threshold`` and an identical context (crop,
+    district). The whole cache is dropped when the knowledge-index generation
+    changes, since term ids and the answers' grounding may both have moved.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 1024, ttl: float = 86400.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._partitions: Dict[str, "OrderedDict[str, _SemanticEntry]"] = {}
+        self._postings: Dict[str, Dict[int, Set[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _check_generation(self, generation: int) -> None:
+        if self._generation != generation:
+            self._partitions.clear()
+            self._postings.clear()
+            self._generation = generation
+
+    def lookup(self, language: str, ids: np.ndarray, weights: np.ndarray, context: Tuple[str, ...],
+               generation: int = 0) -> Optional[Tuple[Dict[str, Any], float]]:
+        if not self.enabled or len(ids) == 0:
+            return None
+        now = time.time()
+        with self._lock:
+            self._check_generation(generation)
+            part = self._partitions.get(language)
+            postings = self._postings.get(language, {})
+            best_key, best_sim = None, 0.0
+            candidates: Set[str] = set()
+            for tid in ids.tolist():
+                candidates |= postings.get(tid, set())
+            for key in candidates:
+                entry = part[key]
+                if entry.context != context or entry.expires < now:
+                    continue
+                _, qi, ei = np.intersect1d(ids, entry.ids, assume_unique=True, return_indices=True)
+                sim = float(np.dot(weights[qi], entry.weights[ei]))
+                if sim > best_sim:
+                    best_key, best_sim = key, sim
+            if best_key is None or best_sim < self.threshold:
+                self.misses += 1
+                return None
+            part.move_to_end(best_key)
+            self.hits += 1
+            return part[best_key].value, best_sim
+
+    def store(self, language: str, key: str, ids: np.ndarray, weights: np.ndarray, context: Tuple[str, ...],
+              value: Dict[str, Any], generation: int = 0) -> None:
+        if not self.enabled or len(ids) == 0:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            part = self._partitions.setdefault(language, OrderedDict())
+            postings = self._postings.setdefault(language, {})
+            self._evict(language, key)
+            part[key] = _SemanticEntry(ids, weights, context, value, time.time() + self.ttl)
+            for tid in ids.tolist():
+                postings.setdefault(tid, set()).add(key)
+            while len(part) > self.max_entries:
+                self._evict(language, next(iter(part)))
+
+    def _evict(self, language: str, key: str) -> None:
+        entry = self._partitions[language].pop(key, None)
+        if entry is None:
+            return
+        postings = self._postings[language]
+        for tid in entry.ids.tolist():
+            keys = postings.get(tid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del postings[tid]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._partitions.clear()
+            self._postings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": {lang: len(part) for lang, part in self._partitions.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,132 @@
+"""Request coalescing for the answer path.
+
+:class:`SingleFlight` lets concurrent callers with the same key share one
+in-flight coroutine (one Gemini call for many identical prompts).
+:class:`MicroBatcher` gathers work items that arrive within a few
+milliseconds of each other and hands them to one batched function call
+(one vectorised retrieval pass for many requests).
+
+Both expect to be used from a single event loop, as in a uvicorn worker.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "loop", "waiters")
+
+    def __init__(self, task: "asyncio.Future[Any]", loop: asyncio.AbstractEventLoop):
+        self.task = task
+        self.loop = loop
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """Share one in-flight call among concurrent callers with the same key.
+
+    The shared call is reference-counted: a caller that is cancelled (e.g.
+    its client disconnected) only cancels the call if nobody else is still
+    waiting for it. Nothing is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        flight = self._flights.get(key)
+        if flight is None or flight.loop is not loop or flight.task.done():
+            flight = _Flight(asyncio.ensure_future(factory()), loop)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.started += 1
+        else:
+            self.shared += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "started": self.started, "shared": self.shared}
+
+
+class MicroBatcher(Generic[T]):
+    """Run ``fn(items) -> results`` in a worker thread for items submitted close together.
+
+    A batch is flushed ``window`` seconds after its first item arrives, or
+    as soon as it holds ``max_batch`` items. With ``window <= 0`` every item
+    is processed on its own.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[T]], window: float = 0.002, max_batch: int = 64):
+        self.fn = fn
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[Tuple[Any, "asyncio.Future[T]"]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+
+    async def submit(self, item: Any) -> T:
+        if self.window <= 0:
+            return (await self._call([item]))[0]
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._pending, self._timer, self._loop = [], None, loop
+        fut: "asyncio.Future[T]" = loop.create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, "asyncio.Future[T]"]]) -> None:
+        try:
+            results = await self._call([item for item, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    async def _call(self, items: List[Any]) -> List[T]:
+        self.batches += 1
+        self.items += len(items)
+        self.largest = max(self.largest, len(items))
+        return await run_in_threadpool(self.fn, items)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": round(self.window * 1000, 3),
+            "batches": self.batches,
+            "items": self.items,
+            "largest_batch": self.largest,
+        }
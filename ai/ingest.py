@@ -0,0 +1,264 @@
+"""Bulk knowledge-base ingestion.
+
+Streams advisory documents (JSONL / CSV exports from the Agriculture
+Department, or answered farmer queries from the app database) into the
+retriever in fixed-size chunks: records are read lazily, deduplicated by a
+hash of their normalised text, tokenised across a process pool and added to
+the index incrementally. Nothing is held in memory beyond the chunks in
+flight.
+
+Usage::
+
+    python -m ai.ingest advisories.jsonl pests.csv --index instance/kb_index
+    python -m ai.ingest --from-db sqlite:///instance/farmer_support.db
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Executor, Future
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from pydantic import BaseModel
+
+from ai.retrieval import Document, InMemoryRetriever, load_seed_knowledge
+from ai.scoring import make_scorer
+from ai.tokenizer import normalize_text, tokenize
+
+TEXT_FIELDS = ("text", "content", "advisory", "body")
+ID_FIELDS = ("id", "doc_id", "advisory_id")
+
+
+class IngestReport(BaseModel):
+    read: int = 0
+    added: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.read / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(normalize_text(text).split()).encode("utf-8")).hexdigest()
+
+
+# -- readers -----------------------------------------------------------------
+
+def iter_jsonl(fh: TextIO) -> Iterator[Dict[str, Any]]:
+    for line in fh:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        # malformed lines and non-object values ([], "x", 3) come through as empty records (skipped)
+        yield record if isinstance(record, dict) else {}
+
+
+def iter_csv(fh: TextIO) -> Iterator[Dict[str, Any]]:
+    yield from csv.DictReader(fh)
+
+
+def iter_file(path: str, fmt: str = "auto") -> Iterator[Dict[str, Any]]:
+    if fmt == "auto":
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+    with open(path, "r", encoding="utf-8-sig", newline="") as fh:
+        yield from (iter_csv(fh) if fmt == "csv" else iter_jsonl(fh))
+
+
+def iter_stream(binary: io.IOBase, fmt: str) -> Iterator[Dict[str, Any]]:
+    """Read records from an uploaded (binary) file object without loading it whole."""
+    fh = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    try:
+        yield from (iter_csv(fh) if fmt == "csv" else iter_jsonl(fh))
+    finally:
+        fh.detach()
+
+
+def iter_query_responses(database_url: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Answered farmer queries and their responses, streamed from the app DB."""
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(database_url)
+    sql = text(
+        "SELECT r.id, q.query_text, r.response_text, r.response_type, q.crop_type, q.language, q.location "
+        "FROM query_responses r JOIN farmer_queries q ON q.id = r.query_id "
+        "WHERE q.status = 'answered' AND r.response_type IN ('ai', 'human') "
+        "ORDER BY r.id"
+    )
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(sql)
+            for rid, question, answer, rtype, crop, language, location in result:
+                yield {
+                    "id": f"qr-{rid}",
+                    "text": f"Q: {question}\nA: {answer}",
+                    "crop": crop,
+                    "language": language,
+                    "location": location,
+                    "topic": "farmer_query",
+                    "response_type": rtype,
+                }
+    finally:
+        engine.dispose()
+
+
+def to_document(record: Dict[str, Any], source: str) -> Optional[Document]:
+    if not isinstance(record, dict):
+        return None
+    text = next((str(record[f]) for f in TEXT_FIELDS if record.get(f)), "").strip()
+    if not text:
+        return None
+    doc_hash = content_hash(text)
+    doc_id = next((str(record[f]) for f in ID_FIELDS if record.get(f)), None) or f"{source}-{doc_hash[:16]}"
+    metadata = {k: v for k, v in record.items() if k not in TEXT_FIELDS + ID_FIELDS and v not in (None, "")}
+    if isinstance(record.get("metadata"), dict):
+        metadata.pop("metadata")
+        metadata.update(record["metadata"])
+    metadata.update({"source": metadata.get("source", source), "content_hash": doc_hash})
+    return Document(id=doc_id, text=text, metadata=metadata)
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# -- pipeline ----------------------------------------------------------------
+
+def _tokenize_batch(texts: List[str], ngram: int) -> List[List[str]]:
+    return [tokenize(t, ngram) for t in texts]
+
+
+class _InlineExecutor(Executor):
+    def submit(self, fn, *args, **kwargs):
+        f: Future = Future()
+        try:
+            f.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            f.set_exception(e)
+        return f
+
+
+def existing_hashes(retriever: InMemoryRetriever) -> Set[str]:
+    return {d.metadata.get("content_hash") or content_hash(d.text) for d in retriever.iter_documents()}
+
+
+def ingest(
+    retriever: InMemoryRetriever,
+    records: Iterable[Tuple[Dict[str, Any], str]],
+    batch_size: int = 500,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[IngestReport], None]] = None,
+) -> IngestReport:
+    """Feed ``(record, source)`` pairs into ``retriever`` chunk by chunk.
+
+    Tokenisation of up to ``2 * workers`` chunks runs ahead in a process pool
+    while the main process merges finished chunks into the index, in order.
+    """
+    report = IngestReport()
+    start = time.time()
+    seen = existing_hashes(retriever)
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    executor: Executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else _InlineExecutor()
+    pending: Deque[Tuple[List[Document], Future]] = deque()
+
+    def drain(limit: int) -> None:
+        while len(pending) > limit:
+            docs, fut = pending.popleft()
+            report.added += retriever.add_documents(docs, tokens=fut.result())
+            report.elapsed = time.time() - start
+            if progress:
+                progress(report)
+
+    try:
+        for chunk in chunked(records, batch_size):
+            by_id: Dict[str, Document] = {}
+            for record, source in chunk:
+                report.read += 1
+                doc = to_document(record, source)
+                if doc is None:
+                    report.skipped += 1
+                    continue
+                if doc.metadata["content_hash"] in seen:
+                    report.duplicates += 1
+                    continue
+                replaced = by_id.pop(doc.id, None)
+                if replaced is not None:
+                    # the same id twice in one chunk: the later record wins, as it would across chunks
+                    seen.discard(replaced.metadata["content_hash"])
+                    report.duplicates += 1
+                seen.add(doc.metadata["content_hash"])
+                by_id[doc.id] = doc
+            docs = list(by_id.values())
+            if docs:
+                pending.append((docs, executor.submit(_tokenize_batch, [d.text for d in docs], retriever.ngram)))
+            drain(2 * max(workers, 1))
+        drain(0)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    report.elapsed = time.time() - start
+    return report
+
+
+def _print_progress(report: IngestReport) -> None:
+    print(
+        f"\r{report.read} read, {report.added} added, {report.duplicates} duplicate, "
+        f"{report.skipped} skipped ({report.rate:.0f} docs/s)",
+        end="", file=sys.stderr, flush=True,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ingest advisory documents into the knowledge index")
+    parser.add_argument("files", nargs="*", help="JSONL or CSV files")
+    parser.add_argument("--format", choices=("auto", "jsonl", "csv"), default="auto")
+    parser.add_argument("--from-db", metavar="DATABASE_URL", help="also ingest answered queries from the app database")
+    parser.add_argument("--index", default=os.environ.get("KB_INDEX_PATH") or str(Path(__file__).resolve().parent.parent / "instance" / "kb_index"))
+    parser.add_argument("--scorer", default=os.environ.get("RETRIEVER_SCORER", "cosine"))
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    if not args.files and not args.from_db:
+        parser.error("nothing to ingest: pass files and/or --from-db")
+
+    scorer = make_scorer(args.scorer)
+    if InMemoryRetriever.exists(args.index):
+        retriever = InMemoryRetriever.load(args.index, scorer=scorer)
+    else:
+        # a new index starts from the same seed knowledge the AI service would build it from
+        retriever = InMemoryRetriever(load_seed_knowledge(), scorer=scorer,
+                                      ngram=int(os.environ.get("RETRIEVER_NGRAM", "3")))
+
+    def records() -> Iterator[Tuple[Dict[str, Any], str]]:
+        for path in args.files:
+            source = Path(path).stem
+            yield from ((r, source) for r in iter_file(path, args.format))
+        if args.from_db:
+            yield from ((r, "farmer_queries") for r in iter_query_responses(args.from_db))
+
+    report = ingest(retriever, records(), batch_size=args.batch_size, workers=args.workers, progress=_print_progress)
+    print(file=sys.stderr)
+    path = retriever.save(args.index)
+    print(f"Ingested {report.added} documents in {report.elapsed:.1f}s; index now has {len(retriever)} documents at {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import google.generativeai as genai
+except Exception:
+    genai = None
+
+
+class LLMResult:
+    __slots__ = ("text", "model", "latency")
+
+    def __init__(self, text: str, model: str, latency: float):
+        self.text = text
+        self.model = model
+        self.latency = latency
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram (seconds) with fixed bucket bounds."""
+
+    BOUNDS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+    def __init__(self, bounds: Sequence[float] = BOUNDS):
+        self.bounds = tuple(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(self.bounds, seconds)] += 1
+            self._sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile."""
+        total = sum(self._counts)
+        if not total:
+            return None
+        running = 0
+        for i, c in enumerate(self._counts):
+            running += c
+            if running >= q * total:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts, total_s = list(self._counts), self._sum
+        cumulative, buckets = 0, {}
+        for bound, c in zip(list(self.bounds) + ["+Inf"], counts):
+            cumulative += c
+            buckets[f"le_{bound}"] = cumulative
+        return {
+            "count": cumulative,
+            "sum": round(total_s, 3),
+            "buckets": buckets,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+
+class GeminiClient:
+    """Process-wide Gemini client.
+
+    ``genai.configure`` runs once and one ``GenerativeModel`` handle per
+    model name is kept for the life of the worker. Calls are bounded by a
+    semaphore (``max_concurrency`` in flight, waiting at most
+    ``queue_timeout`` for a slot) and share one deadline of ``timeout``
+    seconds across the model fallback list.
+
+    :meth:`agenerate` is the event-loop variant used by the async endpoints.
+    It awaits the SDK's ``generate_content_async`` instead of holding a
+    thread, so its own limit (``max_async_concurrency``) can be much higher.
+    :meth:`astream` is the same call in streaming mode.
+    """
+
+    def __init__(self, api_key: Optional[str], model_names: Sequence[str] = ("gemini-1.5-flash",),
+                 max_concurrency: int = 8, timeout: float = 30.0, queue_timeout: float = 5.0,
+                 max_async_concurrency: int = 256):
+        self.api_key = api_key
+        self.model_names: List[str] = list(model_names)
+        self.max_concurrency = max_concurrency
+        self.max_async_concurrency = max_async_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._models: Dict[str, Any] = {}
+        self._configure_lock = threading.Lock()
+        self.latency = LatencyHistogram()
+        self.first_chunk = LatencyHistogram()
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "GeminiClient":
+        models = [m.strip() for m in os.environ.get("GEMINI_MODELS", "gemini-1.5-flash").split(",") if m.strip()]
+        return cls(
+            api_key=os.environ.get("GOOGLE_API_KEY"),
+            model_names=models,
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "8")),
+            timeout=float(os.environ.get("LLM_TIMEOUT", "30")),
+            queue_timeout=float(os.environ.get("LLM_QUEUE_TIMEOUT", "5")),
+            max_async_concurrency=int(os.environ.get("LLM_MAX_ASYNC_CONCURRENCY", "256")),
+        )
+
+    @property
+    def available(self) -> bool:
+        return genai is not None and bool(self.api_key)
+
+    def configure(self) -> bool:
+        """Configure the SDK and build model handles (idempotent)."""
+        if not self.available:
+            return False
+        with self._configure_lock:
+            if not self._models:
+                genai.configure(api_key=self.api_key)
+                self._models = {name: genai.GenerativeModel(name) for name in self.model_names}
+        return True
+
+    def generate(self, prompt: str) -> Optional[LLMResult]:
+        """Generate text, or return None if no model answered within the deadline."""
+        if not self.configure():
+            return None
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            return None
+        try:
+            deadline = time.monotonic() + self.timeout
+            for name, model in self._models.items():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.calls += 1
+                t0 = time.monotonic()
+                try:
+                    resp = model.generate_content(prompt, request_options={"timeout": remaining})
+                    text = getattr(resp, "text", None)
+                except Exception:
+                    text = None
+                elapsed = time.monotonic() - t0
+                self.latency.observe(elapsed)
+                if text:
+                    return LLMResult(text, name, elapsed)
+                self.failures += 1
+            return None
+        finally:
+            self._slots.release()
+
+    async def _acquire_async(self) -> Optional[asyncio.Semaphore]:
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_async_concurrency)
+        slots = self._async_slots
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return None
+        return slots
+
+    async def agenerate(self, prompt: str) -> Optional[LLMResult]:
+        """Async :meth:`generate`; cancelling the awaiting task cancels the call."""
+        if not self.configure():
+            return None
+        slots = await self._acquire_async()
+        if slots is None:
+            return None
+        try:
+            deadline = time.monotonic() + self.timeout
+            for name, model in self._models.items():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.calls += 1
+                t0 = time.monotonic()
+                try:
+                    resp = await asyncio.wait_for(
+                        model.generate_content_async(prompt, request_options={"timeout": remaining}), remaining
+                    )
+                    text = getattr(resp, "text", None)
+                except Exception:
+                    text = None
+                elapsed = time.monotonic() - t0
+                self.latency.observe(elapsed)
+                if text:
+                    return LLMResult(text, name, elapsed)
+                self.failures += 1
+            return None
+        finally:
+            slots.release()
+
+    async def astream(self, prompt: str) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """Yield ``(model, text)`` pieces as Gemini produces them, then
+        ``(model, None)`` once the model has finished the answer.
+
+        The next model in the fallback list is only tried if the previous one
+        failed before producing any text. A stream that breaks half-way, or
+        runs into the deadline, ends with what it has and without the final
+        ``None``, so callers can tell a cut-off answer from a complete one.
+        """
+        if not self.configure():
+            return
+        slots = await self._acquire_async()
+        if slots is None:
+            return
+        try:
+            deadline = time.monotonic() + self.timeout
+            for name, model in self._models.items():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.calls += 1
+                t0 = time.monotonic()
+                produced = complete = False
+                try:
+                    resp = await asyncio.wait_for(
+                        model.generate_content_async(prompt, stream=True, request_options={"timeout": remaining}),
+                        remaining,
+                    )
+                    chunks = resp.__aiter__()
+                    while True:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                        except StopAsyncIteration:
+                            complete = True
+                            break
+                        text = getattr(chunk, "text", None)
+                        if text:
+                            if not produced:
+                                self.first_chunk.observe(time.monotonic() - t0)
+                                produced = True
+                            yield name, text
+                except Exception:
+                    pass
+                self.latency.observe(time.monotonic() - t0)
+                if produced:
+                    if complete:
+                        yield name, None
+                    else:
+                        self.failures += 1
+                    return
+                self.failures += 1
+        finally:
+            slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "models": self.model_names,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.max_concurrency - self._slots._value,
+            "in_flight_async": (self.max_async_concurrency - self._async_slots._value) if self._async_slots else 0,
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "latency_seconds": self.latency.snapshot(),
+            "first_chunk_seconds": self.first_chunk.snapshot(),
+        }
@@ -0,0 +1,182 @@
+"""Perceptual hashes and a near-duplicate cache for image analysis results.
+
+Photos from one outbreak get re-shared, recompressed and lightly cropped,
+so their bytes differ while the picture does not. A 64-bit perceptual hash
+(pHash: signs of the low DCT frequencies; dHash: signs of horizontal
+gradients) changes by only a few bits under such edits. Cached results are
+indexed for Hamming-distance search with multi-index hashing, so a lookup
+compares the query against a small share of the cache.
+"""
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+
+def _grey(contents: bytes, size: Tuple[int, int]) -> np.ndarray:
+    with Image.open(io.BytesIO(contents)) as img:
+        # JPEG can be decoded straight at 1/8 scale; the hash only needs a thumbnail
+        img.draft("L", (size[0] * 4, size[1] * 4))
+        img = ImageOps.exif_transpose(img).convert("L").resize(size, Image.LANCZOS)
+    return np.asarray(img, dtype=np.float32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(contents: bytes) -> int:
+    """64-bit difference hash: is each pixel brighter than its right neighbour (9x8 grey)?"""
+    px = _grey(contents, (9, 8))
+    return _bits_to_int(px[:, 1:] > px[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def phash(contents: bytes) -> int:
+    """64-bit DCT hash: 8x8 lowest frequencies of a 32x32 grey image, thresholded at their median."""
+    px = _grey(contents, (32, 32))
+    low = (_DCT32 @ px @ _DCT32.T)[:8, :8].ravel()
+    # the DC term only says how bright the image is; keep it out of the median
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+HASHES = {"phash": phash, "dhash": dhash}
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class MultiIndex:
+    """Multi-index hashing over 64-bit hashes for radius-``k`` Hamming search.
+
+    Hashes are cut into ``k + 1`` disjoint bit ranges, each with its own
+    table (range value -> hashes). Two hashes within distance ``k`` agree
+    exactly on at least one range (pigeonhole), so a search only checks the
+    hashes that share a range value with the query.
+    """
+
+    def __init__(self, max_distance: int, bits: int = 64):
+        parts = max_distance + 1
+        bounds = [round(i * bits / parts) for i in range(parts + 1)]
+        self._ranges = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])]
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in self._ranges]
+        self.size = 0
+
+    def _keys(self, h: int) -> Iterator[Tuple[Dict[int, Set[int]], int]]:
+        for table, (shift, mask) in zip(self._tables, self._ranges):
+            yield table, (h >> shift) & mask
+
+    def add(self, h: int) -> None:
+        for table, key in self._keys(h):
+            table.setdefault(key, set()).add(h)
+        self.size += 1
+
+    def remove(self, h: int) -> None:
+        for table, key in self._keys(h):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(h)
+                if not bucket:
+                    del table[key]
+        self.size -= 1
+
+    def candidates(self, h: int) -> Set[int]:
+        found: Set[int] = set()
+        for table, key in self._keys(h):
+            found |= table.get(key, set())
+        return found
+
+
+class PerceptualCache:
+    """Thread-safe LRU of image analysis results, looked up by perceptual-hash distance.
+
+    A lookup returns the closest cached result within ``max_distance`` bits.
+    """
+
+    def __init__(self, max_distance: int = 8, max_entries: int = 4096, ttl: float = 86400.0, algorithm: str = "phash"):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.algorithm = algorithm
+        self._hash = HASHES[algorithm]
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._index = MultiIndex(max_distance)
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def hash(self, contents: bytes) -> Optional[int]:
+        """Perceptual hash of an encoded image, or None if Pillow cannot read it (CPU-bound)."""
+        try:
+            return self._hash(contents)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+
+    def lookup(self, h: int) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Closest cached result and its distance, or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            best: Optional[Tuple[int, int]] = None
+            for candidate in self._index.candidates(h):
+                d = hamming(h, candidate)
+                if d > self.max_distance or (best is not None and d >= best[0]):
+                    continue
+                if self._data[candidate][0] < now:
+                    continue
+                best = (d, candidate)
+            if best is None:
+                self.misses += 1
+                return None
+            d, candidate = best
+            self._data.move_to_end(candidate)
+            self.hits += 1
+            if d:
+                self.near_hits += 1
+            return self._data[candidate][1], d
+
+    def store(self, h: int, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._data.pop(h, None) is None:
+                self._index.add(h)
+            self._data[h] = (time.time() + self.ttl, value)
+            while len(self._data) > self.max_entries:
+                evicted, _ = self._data.popitem(last=False)
+                self._index.remove(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._index = MultiIndex(self.max_distance)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "algorithm": self.algorithm,
+            "max_distance": self.max_distance,
+            "entries": len(self._data),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,640 @@
+import copy
+import json
+import mmap
+import os
+import shutil
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, NamedTuple, Tuple, Optional, Union, Iterator
+
+import numpy as np
+from pydantic import BaseModel
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves from several processes are not serialised
+    fcntl = None
+
+from ai.scoring import Scorer, CosineScorer, make_scorer
+from ai.tokenizer import tokenize
+
+# embed(): out-of-vocabulary tokens are hashed into this id range, past any real term id
+OOV_BASE = 1 << 30
+OOV_BUCKETS = 1 << 20
+
+
+class Document(BaseModel):
+    id: str
+    text: str
+    metadata: Dict[str, Any] = {}
+
+
+_ARRAYS = ("indptr", "indices", "tf", "data", "term_ptr", "post_docs", "post_weights", "doc_offsets")
+
+
+def _take_rows(indptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (new_indptr, entry_offsets) selecting ``rows`` of a CSR matrix."""
+    indptr = np.asarray(indptr)
+    starts = indptr[:-1][rows]
+    lengths = indptr[1:][rows] - starts
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_indptr[1:])
+    offsets = np.repeat(starts - new_indptr[:-1], lengths) + np.arange(new_indptr[-1])
+    return new_indptr, offsets
+
+
+def _postings(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, n_terms: int):
+    """Transpose CSR rows into per-term postings (CSC) for term-at-a-time scoring."""
+    doc_of_entry = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    term_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n_terms), out=term_ptr[1:])
+    return term_ptr, doc_of_entry[order], data[order].astype(np.float32)
+
+
+class _Segment:
+    """An immutable slice of the index.
+
+    Arrays are either plain NumPy arrays (documents added at runtime) or
+    read-only memory maps of an on-disk generation, in which case document
+    bodies are decoded lazily from ``docs.jsonl``.
+    """
+
+    def __init__(self, doc_ids: List[str], arrays: Dict[str, np.ndarray],
+                 docs: Optional[List[Document]] = None, blob: Union[bytes, mmap.mmap] = b""):
+        self.doc_ids = doc_ids
+        self.indptr = arrays["indptr"]
+        self.indices = arrays["indices"]
+        self.tf = arrays["tf"]
+        self.data = arrays["data"]
+        self.term_ptr = arrays["term_ptr"]
+        self.post_docs = arrays["post_docs"]
+        self.post_weights = arrays["post_weights"]
+        self.doc_offsets = arrays.get("doc_offsets")
+        self._docs = docs
+        self._blob = blob
+
+    @classmethod
+    def build(cls, docs: List[Document], indptr: np.ndarray, indices: np.ndarray, tf: np.ndarray,
+              data: np.ndarray, n_terms: int) -> "_Segment":
+        term_ptr, post_docs, post_weights = _postings(indptr, indices, data, n_terms)
+        arrays = {
+            "indptr": indptr, "indices": indices, "tf": tf, "data": data,
+            "term_ptr": term_ptr, "post_docs": post_docs, "post_weights": post_weights,
+        }
+        return cls([d.id for d in docs], arrays, docs=docs)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def document(self, pos: int) -> Document:
+        if self._docs is not None:
+            return self._docs[pos]
+        start, end = int(self.doc_offsets[pos]), int(self.doc_offsets[pos + 1])
+        return Document(**json.loads(self._blob[start:end].decode("utf-8")))
+
+    def rows(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Raw term-frequency CSR (indptr, indices, tf) restricted to ``positions``."""
+        indptr, offsets = _take_rows(self.indptr, positions)
+        return indptr, np.asarray(self.indices)[offsets], np.asarray(self.tf)[offsets]
+
+    def score(self, ids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        n_docs = len(self)
+        # terms added to the vocabulary after this segment was built have no postings here
+        known = ids < len(self.term_ptr) - 1
+        ids, weights = ids[known], weights[known]
+        if len(ids) == 0 or n_docs == 0:
+            return np.zeros(n_docs, dtype=np.float32)
+        starts = self.term_ptr[ids]
+        lengths = self.term_ptr[ids + 1] - starts
+        # gather every posting of every query term in one shot
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        contrib = self.post_weights[offsets] * np.repeat(weights, lengths)
+        return np.bincount(self.post_docs[offsets], weights=contrib, minlength=n_docs).astype(np.float32)
+
+    def score_batch(self, qptr: np.ndarray, ids: np.ndarray,
+                    weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """:meth:`score` for several queries (CSR rows ``qptr``) in one pass.
+
+        Returns only the touched cells as ``(cell_ptr, positions, scores)``:
+        query ``q``'s documents are ``positions[cell_ptr[q]:cell_ptr[q + 1]]``,
+        in row order. Untouched documents score 0.
+        """
+        n_queries, n_docs = len(qptr) - 1, len(self)
+        rows = np.repeat(np.arange(n_queries), np.diff(qptr))
+        known = ids < len(self.term_ptr) - 1
+        ids, weights, rows = ids[known], weights[known], rows[known]
+        starts = self.term_ptr[ids]
+        lengths = self.term_ptr[ids + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        contrib = self.post_weights[offsets] * np.repeat(weights, lengths)
+        cells = np.repeat(rows, lengths).astype(np.int64) * n_docs + self.post_docs[offsets]
+        # per cell the terms add up in the same order as in score(), so the sums are identical
+        cells, inverse = np.unique(cells, return_inverse=True)
+        scores = np.bincount(inverse, weights=contrib, minlength=len(cells)).astype(np.float32)
+        cell_ptr = np.searchsorted(cells, np.arange(n_queries + 1) * n_docs)
+        return cell_ptr, cells % max(n_docs, 1), scores
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    k = min(top_k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    above = np.flatnonzero(scores > kth)
+    # ties broken by higher index first, matching the previous sort order
+    ties = np.flatnonzero(scores == kth)[::-1][:k - len(above)]
+    top = np.concatenate([above, ties])
+    return top[np.lexsort((-top, -scores[top]))]
+
+
+def _top_k_sparse(positions: np.ndarray, scores: np.ndarray, mask: np.ndarray,
+                  top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """:func:`_top_k` over live rows, given only the rows with a score (ascending ``positions``)."""
+    hit = (scores > 0) & mask[positions]
+    positions, scores = positions[hit], scores[hit]
+    best = _top_k(scores, top_k)
+    top, top_scores = positions[best], scores[best]
+    need = min(top_k, int(mask.sum())) - len(top)
+    if need > 0:
+        # the rest score 0; _top_k takes those from the highest row down
+        rest = np.flatnonzero(mask)[::-1]
+        rest = rest[~np.isin(rest, positions)][:need]
+        top = np.concatenate([top, rest])
+        top_scores = np.concatenate([top_scores, np.zeros(len(rest), dtype=np.float32)])
+    return top, top_scores
+
+
+def load_seed_knowledge() -> List[Document]:
+    """Built-in starting knowledge, used whenever an index is created from nothing."""
+    # Minimal seed; in a real app load from files/DB
+    seeds = [
+        ("pest_banana_leaf_spot", "For banana leaf spot (Sigatoka), use mancozeb or propiconazole as per label. Ensure proper sanitation and remove affected leaves.", {"crop": "Banana", "topic": "pest"}),
+        ("rice_blast", "Rice blast can be managed with tricyclazole; avoid excess nitrogen and maintain field hygiene.", {"crop": "Rice", "topic": "disease"}),
+        ("kerala_weather", "Check IMD Kerala district forecast; heavy rain June-Sep. Ensure drainage in low-lying fields.", {"topic": "weather"}),
+        ("schemes_subsidy", "For subsidies, refer to Kerala Department of Agriculture e-Krishi portal and PM-KISAN eligibility.", {"topic": "scheme"}),
+    ]
+    return [Document(id=i, text=t, metadata=m) for i, t, m in seeds]
+
+
+class _IndexState(NamedTuple):
+    """Everything a query reads, replaced as one tuple so a reader never mixes
+    the term ids of one vocabulary with the segments of another"""
+    vocab: Dict[str, int]
+    scorer: Scorer
+    locations: Dict[str, Tuple[int, int]]
+    segments: List[_Segment]
+    alive: List[np.ndarray]
+
+
+@contextmanager
+def _index_lock(root: Path) -> Iterator[None]:
+    """Exclusive lock on an index directory, held across processes while a generation is written."""
+    if fcntl is None:
+        yield
+        return
+    with open(root / "LOCK", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class InMemoryRetriever:
+    """Sparse bag-of-words retriever.
+
+    Documents are stored as a CSR matrix of term weights
+    (``indptr``/``indices``/``data``) plus an inverted index (postings per
+    term), so a query only touches documents that share at least one term
+    with it and scoring is a single batched sparse dot product. How terms are
+    weighted (cosine, TF-IDF, BM25) is delegated to a :class:`Scorer`.
+
+    The index is split into segments: a base segment, usually memory-mapped
+    from a generation written by :meth:`save`, and a delta segment holding
+    documents added since. Removed documents are tombstoned until the next
+    :meth:`save`, which compacts everything into a new on-disk generation::
+
+        kb_index/
+            CURRENT               name of the live generation
+            LOCK                  flock()ed while a generation is written
+            gen-000003/
+                meta.json         scorer, n-gram size, corpus statistics
+                vocab.txt         one term per line, line number = term id
+                ids.json          document ids, in row order
+                docs.jsonl        document bodies, sliced by doc_offsets
+                df.npy, indptr.npy, indices.npy, tf.npy, data.npy,
+                term_ptr.npy, post_docs.npy, post_weights.npy, doc_offsets.npy
+
+    Every worker that loads the same generation maps the same files, so the
+    pages are shared through the OS page cache. Saves are serialised with a
+    lock on the directory; a save that finds a newer generation than the one
+    it started from re-applies its unsaved changes on top of that one.
+    """
+
+    def __init__(self, docs: List[Document], scorer: Optional[Scorer] = None, ngram: int = 3):
+        self.ngram = ngram
+        self.generation = 0
+        self.index_path: Optional[Path] = None
+        self.index_generation: Optional[str] = None
+        self._lock = threading.RLock()
+        self._state = _IndexState({}, scorer or CosineScorer(), {}, [], [])
+        # changes since the generation this index was loaded from: id -> document, or None if removed
+        self._unsaved: Dict[str, Optional[Document]] = {}
+        self._build_index(docs)
+
+    # writers grow vocab and update scorer statistics in place, under the lock;
+    # replacing either swaps the whole state
+    @property
+    def vocab(self) -> Dict[str, int]:
+        return self._state.vocab
+
+    @vocab.setter
+    def vocab(self, vocab: Dict[str, int]) -> None:
+        self._state = self._state._replace(vocab=vocab)
+
+    @property
+    def scorer(self) -> Scorer:
+        return self._state.scorer
+
+    @scorer.setter
+    def scorer(self, scorer: Scorer) -> None:
+        self._state = self._state._replace(scorer=scorer)
+
+    def _tokenize(self, text: str) -> List[str]:
+        return tokenize(text, self.ngram)
+
+    def _term_counts(self, text: str, grow: bool = False, tokens: Optional[List[str]] = None,
+                     oov: bool = False, vocab: Optional[Dict[str, int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        vocab = self.vocab if vocab is None else vocab
+        counts: Dict[int, float] = {}
+        for token in (tokens if tokens is not None else self._tokenize(text)):
+            tid = vocab.get(token)
+            if tid is None:
+                if grow:
+                    tid = vocab[token] = len(vocab)
+                elif oov:
+                    tid = OOV_BASE + zlib.crc32(token.encode("utf-8")) % OOV_BUCKETS
+                else:
+                    continue
+            counts[tid] = counts.get(tid, 0.0) + 1.0
+        ids = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        vals = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        order = np.argsort(ids)
+        return ids[order], vals[order]
+
+    def _vectorize(self, text: str, state: _IndexState) -> Tuple[np.ndarray, np.ndarray]:
+        ids, counts = self._term_counts(text, vocab=state.vocab)
+        return ids, state.scorer.weigh_query(ids, counts)
+
+    def embed(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """L2-normalised TF-IDF query vector (sorted term ids, weights).
+
+        Independent of the ranking scorer, so vectors of two queries can be
+        compared with a plain dot product (used by the semantic answer cache).
+        Words outside the vocabulary are hashed into ids above ``OOV_BASE``
+        with the highest IDF, so questions that differ only in such words
+        ("... for my cows?") are not near-duplicates.
+        """
+        state = self._state
+        ids, counts = self._term_counts(text, oov=True, vocab=state.vocab)
+        idf = np.log((1.0 + state.scorer.n_docs) / (1.0 + state.scorer.doc_freq(ids))) + 1.0
+        vals = (1.0 + np.log(counts)) * idf
+        norm = float(np.sqrt(np.dot(vals, vals)))
+        return ids, (vals / norm if norm > 0 else vals).astype(np.float32)
+
+    def _tf_rows(self, docs: List[Document], tokens: Optional[List[List[str]]] = None):
+        # build vocab and raw term-frequency CSR rows in one pass
+        indptr = [0]
+        rows_ids: List[np.ndarray] = []
+        rows_tf: List[np.ndarray] = []
+        for i, d in enumerate(docs):
+            ids, counts = self._term_counts(d.text, grow=True, tokens=tokens[i] if tokens is not None else None)
+            rows_ids.append(ids)
+            rows_tf.append(counts)
+            indptr.append(indptr[-1] + len(ids))
+        indices = np.concatenate(rows_ids) if rows_ids else np.zeros(0, dtype=np.int32)
+        tf = np.concatenate(rows_tf) if rows_tf else np.zeros(0, dtype=np.float32)
+        return np.asarray(indptr, dtype=np.int64), indices, tf
+
+    def _build_index(self, docs: List[Document]) -> None:
+        indptr, indices, tf = self._tf_rows(docs)
+        # corpus statistics (IDF, document lengths) are computed once, here
+        data = self.scorer.fit(indptr, indices, tf)
+        self._publish([_Segment.build(docs, indptr, indices, tf, data, len(self.vocab))])
+
+    def _publish(self, segments: List[_Segment], alive: Optional[List[np.ndarray]] = None,
+                 relocate_from: int = 0) -> None:
+        alive = alive if alive is not None else [np.ones(len(s), dtype=bool) for s in segments]
+        # segments before relocate_from keep their positions; the rest are (re)located in a copy
+        locations = dict(self._state.locations) if relocate_from else {}
+        for si in range(relocate_from, len(segments)):
+            ids = segments[si].doc_ids
+            for pos in np.flatnonzero(alive[si]):
+                locations[ids[pos]] = (si, int(pos))
+        self._state = self._state._replace(locations=locations, segments=segments, alive=alive)
+        self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self._state.locations)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._state.locations
+
+    def get_document(self, doc_id: str) -> Optional[Document]:
+        state = self._state
+        loc = state.locations.get(doc_id)
+        return state.segments[loc[0]].document(loc[1]) if loc else None
+
+    def iter_documents(self) -> Iterator[Document]:
+        state = self._state
+        for seg, mask in zip(state.segments, state.alive):
+            for pos in np.flatnonzero(mask):
+                yield seg.document(int(pos))
+
+    def query(self, text: str, top_k: int = 3) -> List[Document]:
+        state = self._state
+        ids, weights = self._vectorize(text, state)
+        segments, alive = state.segments, state.alive
+        tops: List[Tuple[np.ndarray, np.ndarray]] = []
+        for seg, mask in zip(segments, alive):
+            scores = seg.score(ids, weights)
+            scores[~mask] = -1.0
+            top = _top_k(scores, top_k)
+            top = top[mask[top]]
+            tops.append((top, scores[top]))
+        return self._merge(segments, tops, top_k)
+
+    def query_batch(self, texts: List[str], top_k: int = 3) -> List[List[Document]]:
+        """:meth:`query` for many texts at once, with identical results.
+
+        Each segment gathers the postings of all queries in one vectorised
+        pass and keeps only the (query, document) cells that were touched,
+        so no per-query array over the whole collection is needed.
+        """
+        if not texts:
+            return []
+        state = self._state
+        vectors = [self._vectorize(t, state) for t in texts]
+        qptr = np.cumsum([0] + [len(ids) for ids, _ in vectors])
+        ids = np.concatenate([ids for ids, _ in vectors])
+        weights = np.concatenate([w for _, w in vectors])
+        segments, alive = state.segments, state.alive
+        batches = [seg.score_batch(qptr, ids, weights) for seg in segments]
+        results: List[List[Document]] = []
+        for qi in range(len(texts)):
+            tops = [
+                _top_k_sparse(positions[cell_ptr[qi]:cell_ptr[qi + 1]], scores[cell_ptr[qi]:cell_ptr[qi + 1]], mask, top_k)
+                for (cell_ptr, positions, scores), mask in zip(batches, alive)
+            ]
+            results.append(self._merge(segments, tops, top_k))
+        return results
+
+    @staticmethod
+    def _merge(segments: List[_Segment], tops: List[Tuple[np.ndarray, np.ndarray]], top_k: int) -> List[Document]:
+        """Merge each segment's (positions, scores) top-k into the overall top-k."""
+        cand_refs = [(si, int(pos)) for si, (top, _) in enumerate(tops) for pos in top]
+        if not cand_refs:
+            return []
+        merged = np.concatenate([scores for _, scores in tops])
+        # stable on ties: keeps each segment's own tie order
+        order = np.lexsort((np.arange(len(merged)), -merged))[:top_k]
+        results: List[Document] = []
+        for i in order:
+            si, pos = cand_refs[i]
+            d = segments[si].document(pos)
+            results.append(Document(id=d.id, text=d.text, metadata={**d.metadata, "similarity": float(merged[i])}))
+        return results
+
+    # -- incremental updates -------------------------------------------------
+
+    def add_documents(self, docs: List[Document], tokens: Optional[List[List[str]]] = None) -> int:
+        """Add (or replace, by id) documents without rebuilding the index.
+
+        New rows are weighted with the current corpus statistics and merged
+        into the in-memory delta segment; ``tokens`` may carry pre-tokenised
+        text (as produced by :func:`ai.tokenizer.tokenize`) for each doc.
+        """
+        if not docs:
+            return 0
+        with self._lock:
+            for d in docs:
+                self._remove_locked(d.id)
+                self._unsaved[d.id] = d
+            indptr, indices, tf = self._tf_rows(docs, tokens)
+            self.scorer.update_stats(indptr, indices, tf)
+
+            segments, alive = list(self._state.segments), list(self._state.alive)
+            delta_docs: List[Document] = list(docs)
+            if len(segments) > 1:
+                # fold the existing delta's live rows into the new one
+                old, mask = segments.pop(), alive.pop()
+                keep = np.flatnonzero(mask)
+                old_indptr, old_indices, old_tf = old.rows(keep)
+                delta_docs = [old.document(int(p)) for p in keep] + delta_docs
+                indices = np.concatenate([old_indices, indices])
+                tf = np.concatenate([old_tf, tf])
+                indptr = np.concatenate([old_indptr, indptr[1:] + old_indptr[-1]])
+            data = self.scorer.weigh_documents(indptr, indices, tf)
+            segments.append(_Segment.build(delta_docs, indptr, indices, tf, data, len(self.vocab)))
+            alive.append(np.ones(len(delta_docs), dtype=bool))
+            self._publish(segments, alive, relocate_from=len(segments) - 1)
+        return len(docs)
+
+    def remove_document(self, doc_id: str) -> bool:
+        with self._lock:
+            removed = self._remove_locked(doc_id)
+            if removed:
+                self._unsaved[doc_id] = None
+                self.generation += 1
+            return removed
+
+    def _remove_locked(self, doc_id: str) -> bool:
+        state = self._state
+        loc = state.locations.pop(doc_id, None)
+        if loc is None:
+            return False
+        si, pos = loc
+        state.scorer.update_stats(*state.segments[si].rows(np.array([pos])), sign=-1)
+        mask = state.alive[si].copy()
+        mask[pos] = False
+        self._state = state._replace(alive=state.alive[:si] + [mask] + state.alive[si + 1:])
+        return True
+
+    # -- persistence ---------------------------------------------------------
+
+    @staticmethod
+    def exists(path: Union[str, Path]) -> bool:
+        return (Path(path) / "CURRENT").is_file()
+
+    def save(self, path: Union[str, Path, None] = None) -> Path:
+        """Compact live documents into a new on-disk generation and switch to it.
+
+        Statistics and weights are recomputed from scratch, so drift from
+        incremental updates is folded back in. ``CURRENT`` is replaced
+        atomically; older generations are removed best-effort (workers that
+        still map them keep reading the unlinked files until they reload).
+        """
+        root = Path(path or self.index_path)
+        root.mkdir(parents=True, exist_ok=True)
+        with self._lock, _index_lock(root):
+            current = (root / "CURRENT").read_text().strip() if self.exists(root) else "gen-000000"
+            if root == self.index_path and self.index_generation not in (None, current):
+                # another process saved since this index was loaded: build on its generation instead
+                self._rebase()
+            segments, alive = self._state.segments, self._state.alive
+            docs: List[Document] = []
+            parts_indptr, parts_indices, parts_tf = [np.zeros(1, dtype=np.int64)], [], []
+            n_entries = 0
+            for seg, mask in zip(segments, alive):
+                keep = np.flatnonzero(mask)
+                indptr, indices, tf = seg.rows(keep)
+                parts_indptr.append(indptr[1:] + n_entries)
+                n_entries += int(indptr[-1])
+                parts_indices.append(indices)
+                parts_tf.append(tf)
+                docs.extend(seg.document(int(p)) for p in keep)
+            indptr = np.concatenate(parts_indptr)
+            indices = np.concatenate(parts_indices).astype(np.int32) if parts_indices else np.zeros(0, dtype=np.int32)
+            tf = np.concatenate(parts_tf).astype(np.float32) if parts_tf else np.zeros(0, dtype=np.float32)
+            data = self.scorer.fit(indptr, indices, tf)
+            segment = _Segment.build(docs, indptr, indices, tf, data, len(self.vocab))
+
+            name = f"gen-{int(current.rsplit('-', 1)[-1]) + 1:06d}"
+            tmp = root / f".{name}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir()
+            self._write_generation(tmp, segment)
+            os.replace(tmp, root / name)
+            pointer = root / f".CURRENT.{os.getpid()}.tmp"
+            pointer.write_text(name)
+            os.replace(pointer, root / "CURRENT")
+            for old in root.glob("gen-*"):
+                if old.name != name:
+                    shutil.rmtree(old, ignore_errors=True)
+            self._unsaved = {}
+            self._publish([self._read_generation(root / name)])
+            self.index_path, self.index_generation = root, name
+        return root / name
+
+    def _rebase(self) -> None:
+        """Load the live on-disk generation and re-apply this index's unsaved changes to it."""
+        fresh = self.load(self.index_path, scorer=copy.copy(self.scorer), ngram=self.ngram)
+        added = [d for d in self._unsaved.values() if d is not None]
+        fresh.add_documents(added)
+        for doc_id, doc in self._unsaved.items():
+            if doc is None:
+                fresh.remove_document(doc_id)
+        self._adopt(fresh)
+
+    def _adopt(self, fresh: "InMemoryRetriever") -> None:
+        self._state = fresh._state
+        self._unsaved = fresh._unsaved
+        self.index_generation = fresh.index_generation
+        self.generation += 1
+
+    def refresh(self) -> bool:
+        """Switch to a newer on-disk generation written by another process.
+
+        Unsaved local additions are dropped, so writers should :meth:`save`
+        right after updating (as the ingestion pipeline does).
+        """
+        if self.index_path is None:
+            return False
+        try:
+            name = (self.index_path / "CURRENT").read_text().strip()
+        except OSError:
+            return False
+        if name == self.index_generation:
+            return False
+        fresh = self.load(self.index_path, scorer=copy.copy(self.scorer), ngram=self.ngram)
+        with self._lock:
+            self._adopt(fresh)
+        return True
+
+    def _write_generation(self, target: Path, segment: _Segment) -> None:
+        offsets = [0]
+        with open(target / "docs.jsonl", "wb") as fh:
+            for pos in range(len(segment)):
+                d = segment.document(pos)
+                line = json.dumps({"id": d.id, "text": d.text, "metadata": d.metadata}, ensure_ascii=False)
+                line = (line + "\n").encode("utf-8")
+                fh.write(line)
+                offsets.append(offsets[-1] + len(line))
+        arrays = {
+            "indptr": segment.indptr, "indices": segment.indices, "tf": segment.tf, "data": segment.data,
+            "term_ptr": segment.term_ptr, "post_docs": segment.post_docs, "post_weights": segment.post_weights,
+            "doc_offsets": np.asarray(offsets, dtype=np.int64),
+        }
+        for name, arr in arrays.items():
+            np.save(target / f"{name}.npy", np.ascontiguousarray(arr))
+        np.save(target / "df.npy", self.scorer.df)
+        terms = [""] * len(self.vocab)
+        for term, tid in self.vocab.items():
+            terms[tid] = term
+        (target / "vocab.txt").write_text("\n".join(terms), encoding="utf-8")
+        (target / "ids.json").write_text(json.dumps(segment.doc_ids, ensure_ascii=False), encoding="utf-8")
+        meta = {
+            "format": 1,
+            "scorer": self.scorer.name,
+            "ngram": self.ngram,
+            "n_docs": self.scorer.n_docs,
+            "total_len": self.scorer.total_len,
+        }
+        (target / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    @staticmethod
+    def _read_generation(source: Path) -> _Segment:
+        arrays = {}
+        for name in _ARRAYS:
+            try:
+                arrays[name] = np.load(source / f"{name}.npy", mmap_mode="r")
+            except ValueError:
+                # zero-length arrays cannot be memory-mapped
+                arrays[name] = np.load(source / f"{name}.npy")
+        doc_ids = json.loads((source / "ids.json").read_text(encoding="utf-8"))
+        blob: Union[bytes, mmap.mmap] = b""
+        with open(source / "docs.jsonl", "rb") as fh:
+            if os.fstat(fh.fileno()).st_size:
+                blob = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return _Segment(doc_ids, arrays, blob=blob)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], scorer: Optional[Scorer] = None,
+             ngram: Optional[int] = None) -> "InMemoryRetriever":
+        """Open the live generation under ``path`` with its arrays memory-mapped.
+
+        If the requested scorer or n-gram size differs from what the index was
+        built with, the index is re-weighted (scorer) or re-tokenised (n-gram)
+        in memory; call :meth:`save` to persist that.
+        """
+        root = Path(path)
+        name = (root / "CURRENT").read_text().strip()
+        source = root / name
+        meta = json.loads((source / "meta.json").read_text(encoding="utf-8"))
+        self = cls.__new__(cls)
+        self._state = _IndexState({}, scorer or make_scorer(meta["scorer"]), {}, [], [])
+        self.ngram = meta["ngram"] if ngram is None else ngram
+        self.generation = 0
+        self.index_path, self.index_generation = root, name
+        self._lock = threading.RLock()
+        self._unsaved = {}
+        terms = (source / "vocab.txt").read_text(encoding="utf-8")
+        self.vocab = {t: i for i, t in enumerate(terms.split("\n"))} if terms else {}
+        segment = cls._read_generation(source)
+        if self.ngram != meta["ngram"]:
+            self.vocab = {}
+            self._build_index([segment.document(p) for p in range(len(segment))])
+            return self
+        self.scorer.df = np.array(np.load(source / "df.npy"))
+        self.scorer.n_docs = meta["n_docs"]
+        self.scorer.total_len = meta["total_len"]
+        if self.scorer.name != meta["scorer"]:
+            indptr, indices, tf = segment.rows(np.arange(len(segment)))
+            data = self.scorer.weigh_documents(indptr, indices, tf)
+            docs = [segment.document(p) for p in range(len(segment))]
+            segment = _Segment.build(docs, indptr, indices, tf, data, len(self.vocab))
+        self._publish([segment])
+        return self
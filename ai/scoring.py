@@ -0,0 +1,135 @@
+from typing import Dict, Type
+
+import numpy as np
+
+
+class Scorer:
+    """Term weighting used by :class:`ai.retrieval.InMemoryRetriever`.
+
+    The scorer owns the corpus statistics (document frequency, document count,
+    total length). They are updated incrementally as documents are added or
+    removed; ``weigh_documents`` turns raw term frequencies into stored
+    weights and ``weigh_query`` turns query term counts into weights such that
+    the sparse dot product with the document weights lands in ``[0, 1]``.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.df = np.zeros(0, dtype=np.int64)
+        self.n_docs = 0
+        self.total_len = 0.0
+
+    def update_stats(self, indptr: np.ndarray, indices: np.ndarray, tf: np.ndarray, sign: int = 1) -> None:
+        n_terms = max(len(self.df), int(indices.max()) + 1 if len(indices) else 0)
+        df = np.zeros(n_terms, dtype=np.int64)
+        df[:len(self.df)] = self.df
+        df += sign * np.bincount(indices, minlength=n_terms)
+        self.df = df
+        self.n_docs += sign * (len(indptr) - 1)
+        self.total_len += sign * float(np.sum(tf))
+
+    def fit(self, indptr: np.ndarray, indices: np.ndarray, tf: np.ndarray) -> np.ndarray:
+        """Recompute statistics from scratch and weigh every stored entry."""
+        self.reset()
+        self.update_stats(indptr, indices, tf)
+        return self.weigh_documents(indptr, indices, tf)
+
+    def weigh_documents(self, indptr: np.ndarray, indices: np.ndarray, tf: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def weigh_query(self, ids: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def doc_freq(self, ids: np.ndarray) -> np.ndarray:
+        df = np.zeros(len(ids), dtype=np.float64)
+        known = ids < len(self.df)
+        df[known] = self.df[ids[known]]
+        return df
+
+    @staticmethod
+    def _l2_normalise_rows(indptr: np.ndarray, vals: np.ndarray) -> np.ndarray:
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        norms = np.sqrt(np.bincount(rows, weights=vals * vals, minlength=len(indptr) - 1))
+        norms[norms == 0] = 1.0
+        return (vals / norms[rows]).astype(np.float32)
+
+    @staticmethod
+    def _l2_normalise(vals: np.ndarray) -> np.ndarray:
+        norm = float(np.sqrt(np.dot(vals, vals)))
+        return (vals / norm if norm > 0 else vals).astype(np.float32)
+
+
+class CosineScorer(Scorer):
+    """Raw term counts, cosine similarity (the original retriever behaviour)."""
+
+    name = "cosine"
+
+    def weigh_documents(self, indptr, indices, tf):
+        return self._l2_normalise_rows(indptr, tf)
+
+    def weigh_query(self, ids, counts):
+        return self._l2_normalise(counts)
+
+
+class TfidfScorer(Scorer):
+    """Sublinear TF x smoothed IDF, cosine similarity."""
+
+    name = "tfidf"
+
+    def _idf(self, ids: np.ndarray) -> np.ndarray:
+        return np.log((1.0 + self.n_docs) / (1.0 + self.doc_freq(ids))) + 1.0
+
+    def weigh_documents(self, indptr, indices, tf):
+        return self._l2_normalise_rows(indptr, (1.0 + np.log(tf)) * self._idf(indices))
+
+    def weigh_query(self, ids, counts):
+        return self._l2_normalise((1.0 + np.log(counts)) * self._idf(ids))
+
+
+class BM25Scorer(Scorer):
+    """Okapi BM25.
+
+    Documents store the saturated TF component, queries carry the IDF, and the
+    query weights are divided by the best score the query could reach (every
+    term fully saturated) so the result stays comparable to cosine scores.
+    """
+
+    name = "bm25"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        super().__init__()
+        self.k1 = k1
+        self.b = b
+
+    def weigh_documents(self, indptr, indices, tf):
+        n_docs = len(indptr) - 1
+        rows = np.repeat(np.arange(n_docs), np.diff(indptr))
+        doc_len = np.bincount(rows, weights=tf, minlength=n_docs)
+        avgdl = self.total_len / self.n_docs if self.n_docs > 0 else 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * doc_len[rows] / (avgdl or 1.0))
+        return (tf * (self.k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+    def weigh_query(self, ids, counts):
+        # IDF lives on the query side so it always reflects the current corpus
+        df = self.doc_freq(ids)
+        w = counts * np.log1p((self.n_docs - df + 0.5) / (df + 0.5))
+        best = float(w.sum()) * (self.k1 + 1.0)
+        return (w / best if best > 0 else w).astype(np.float32)
+
+
+SCORERS: Dict[str, Type[Scorer]] = {
+    CosineScorer.name: CosineScorer,
+    TfidfScorer.name: TfidfScorer,
+    BM25Scorer.name: BM25Scorer,
+}
+
+
+def make_scorer(name: str) -> Scorer:
+    try:
+        return SCORERS[name.strip().lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown retriever scorer {name!r}; expected one of {sorted(SCORERS)}")
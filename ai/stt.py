@@ -0,0 +1,383 @@
+"""Speech-to-text for ``/ai/voice-to-text``.
+
+Audio is transcribed while it arrives. Each chunk of the upload is decoded
+to 16 kHz mono 16-bit PCM and fed to a recognizer session straight away, so
+neither the upload nor the decoded audio is held in memory as a whole.
+Decoding works as follows:
+
+- WAV (16-bit PCM or float) is parsed in-process. Channels are downmixed and
+  the audio is linearly resampled.
+- Anything else (webm/opus from browsers, ogg, mp3, m4a) is piped through
+  ``ffmpeg``, if it is on PATH.
+
+``STT_BACKEND`` picks the engine:
+
+- ``vosk``: offline Kaldi models loaded once per worker. ``VOSK_MODEL_PATH``
+  is the default model, and ``VOSK_MODEL_PATH_<LANG>`` (e.g.
+  ``VOSK_MODEL_PATH_ML``) sets one per language. Needs ``pip install vosk``.
+- ``null``: the placeholder reply, for setups without a model
+- ``auto`` (default): ``vosk`` if it is installed and a model path exists
+
+``python -m ai.stt bench clip.wav`` reports the real-time factor
+(processing time / audio duration) of the configured engine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import vosk
+except Exception:
+    vosk = None
+
+SAMPLE_RATE = 16000
+# PCM handed to the recognizer per threadpool call: 0.5 s of 16-bit mono
+FEED_BYTES = SAMPLE_RATE
+# WAV headers outside these are corrupt or hostile (a tiny rate would make resampling explode)
+WAV_RATES = (1000, 384000)
+WAV_MAX_CHANNELS = 32
+
+PLACEHOLDER = {
+    "ml": "ഓഡിയോ ട്രാൻസ്ക്രിപ്ഷൻ സജ്ജമല്ല. താൽക്കാലിക മറുപടി.",
+    "en": "Voice transcription service not configured. Returning placeholder.",
+}
+
+
+class UnsupportedAudio(ValueError):
+    """The upload is not WAV and no ffmpeg is available to decode it."""
+
+
+class RecognizerSession:
+    """One utterance: ``accept`` 16 kHz mono PCM16 as it arrives, then ``result``."""
+
+    def accept(self, pcm: bytes) -> None:
+        raise NotImplementedError
+
+    def result(self) -> Tuple[str, float]:
+        """(text, confidence)"""
+        raise NotImplementedError
+
+
+class SpeechEngine:
+    name = "none"
+    needs_audio = True
+
+    def session(self, language: str) -> RecognizerSession:
+        raise NotImplementedError
+
+
+class _NullSession(RecognizerSession):
+    def __init__(self, language: str):
+        self.language = language
+
+    def accept(self, pcm: bytes) -> None:
+        pass
+
+    def result(self) -> Tuple[str, float]:
+        return PLACEHOLDER["ml" if self.language == "ml" else "en"], 0.5
+
+
+class NullEngine(SpeechEngine):
+    """No model configured: the audio is discarded and a placeholder returned."""
+
+    name = "placeholder"
+    needs_audio = False
+
+    def session(self, language: str) -> RecognizerSession:
+        return _NullSession(language)
+
+
+class _VoskSession(RecognizerSession):
+    def __init__(self, model: Any):
+        self._rec = vosk.KaldiRecognizer(model, SAMPLE_RATE)
+        self._rec.SetWords(True)
+        self._parts: List[str] = []
+        self._confs: List[float] = []
+
+    def _collect(self, raw: str) -> None:
+        data = json.loads(raw)
+        if data.get("text"):
+            self._parts.append(data["text"])
+            self._confs.extend(float(w.get("conf", 0.0)) for w in data.get("result", []))
+
+    def accept(self, pcm: bytes) -> None:
+        # True at the end of each utterance the recognizer detects
+        if self._rec.AcceptWaveform(pcm):
+            self._collect(self._rec.Result())
+
+    def result(self) -> Tuple[str, float]:
+        self._collect(self._rec.FinalResult())
+        confidence = sum(self._confs) / len(self._confs) if self._confs else 0.0
+        return " ".join(self._parts), confidence
+
+
+class VoskEngine(SpeechEngine):
+    """Offline Kaldi recognizer; models load once and are shared by all sessions."""
+
+    def __init__(self, model_paths: Dict[str, str]):
+        if vosk is None:
+            raise RuntimeError("vosk is not installed; pip install vosk or set STT_BACKEND=null")
+        vosk.SetLogLevel(-1)
+        self.models = {lang: vosk.Model(path) for lang, path in model_paths.items()}
+        self.name = "vosk:" + ",".join(f"{lang}={Path(path).name}" for lang, path in model_paths.items())
+
+    def supports(self, language: str) -> bool:
+        return language in self.models or "default" in self.models
+
+    def session(self, language: str) -> RecognizerSession:
+        if not self.supports(language):
+            return _NullSession(language)
+        return _VoskSession(self.models.get(language) or self.models["default"])
+
+
+def _vosk_model_paths() -> Dict[str, str]:
+    paths = {}
+    if os.environ.get("VOSK_MODEL_PATH"):
+        paths["default"] = os.environ["VOSK_MODEL_PATH"]
+    prefix = "VOSK_MODEL_PATH_"
+    for key, value in os.environ.items():
+        if key.startswith(prefix) and value:
+            paths[key[len(prefix):].lower()] = value
+    return {lang: path for lang, path in paths.items() if os.path.isdir(path)}
+
+
+def engine_from_env() -> SpeechEngine:
+    backend = os.environ.get("STT_BACKEND", "auto").lower()
+    paths = _vosk_model_paths()
+    if backend == "auto":
+        backend = "vosk" if vosk is not None and paths else "null"
+    if backend == "vosk":
+        if not paths:
+            raise RuntimeError("STT_BACKEND=vosk but no VOSK_MODEL_PATH[_<LANG>] directory exists")
+        return VoskEngine(paths)
+    if backend != "null":
+        raise ValueError(f"Unknown STT_BACKEND {backend!r}; expected auto, vosk or null")
+    return NullEngine()
+
+
+class WavDecoder:
+    """Incremental RIFF/WAVE parser: container bytes in, 16 kHz mono PCM16 out.
+
+    Resampling is linear interpolation with its phase carried across chunks;
+    good enough for speech recognisers, which low-pass internally.
+    """
+
+    def __init__(self):
+        self._buf = b""
+        self._header_done = False
+        self.channels = 1
+        self.rate = SAMPLE_RATE
+        self.sample_format = "<i2"
+        self.block = 2
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._pos = 0.0
+
+    def _parse_header(self) -> bool:
+        buf = self._buf
+        if len(buf) < 12:
+            return False
+        if buf[:4] != b"RIFF" or buf[8:12] != b"WAVE":
+            raise UnsupportedAudio("not a WAV file")
+        offset = 12
+        while len(buf) >= offset + 8:
+            chunk_id, size = buf[offset:offset + 4], struct.unpack("<I", buf[offset + 4:offset + 8])[0]
+            if chunk_id == b"data":
+                self._buf = buf[offset + 8:]
+                return True
+            if len(buf) < offset + 8 + size:
+                return False
+            if chunk_id == b"fmt ":
+                fmt, channels, rate, _, block, bits = struct.unpack("<HHIIHH", buf[offset + 8:offset + 24])
+                if fmt == 0xFFFE and size >= 40:  # WAVE_FORMAT_EXTENSIBLE: real format in the sub-GUID
+                    fmt = struct.unpack("<H", buf[offset + 32:offset + 34])[0]
+                if (fmt, bits) == (1, 16):
+                    self.sample_format = "<i2"
+                elif (fmt, bits) == (3, 32):
+                    self.sample_format = "<f4"
+                else:
+                    raise UnsupportedAudio(f"WAV format {fmt} with {bits}-bit samples; only 16-bit PCM or float")
+                if not 1 <= channels <= WAV_MAX_CHANNELS:
+                    raise UnsupportedAudio(f"WAV with {channels} channels")
+                if not WAV_RATES[0] <= rate <= WAV_RATES[1]:
+                    raise UnsupportedAudio(f"WAV sample rate {rate} Hz")
+                if block != channels * bits // 8:
+                    raise UnsupportedAudio(f"WAV block align {block} for {channels} x {bits}-bit samples")
+                self.channels, self.rate, self.block = channels, rate, block
+            offset += 8 + size + (size & 1)
+        return False
+
+    def feed(self, chunk: bytes) -> bytes:
+        self._buf += chunk
+        if not self._header_done:
+            self._header_done = self._parse_header()
+            if not self._header_done:
+                return b""
+        usable = len(self._buf) - len(self._buf) % self.block
+        frames, self._buf = self._buf[:usable], self._buf[usable:]
+        if not frames:
+            return b""
+        x = np.frombuffer(frames, dtype=self.sample_format).astype(np.float32)
+        if self.sample_format == "<f4":
+            x *= 32767.0
+        if self.channels > 1:
+            x = x.reshape(-1, self.channels).mean(axis=1)
+        return self._to_pcm16(self._resample(x))
+
+    def _resample(self, x: np.ndarray) -> np.ndarray:
+        if self.rate == SAMPLE_RATE:
+            return x
+        step = self.rate / SAMPLE_RATE
+        buf = np.concatenate([self._tail, x])
+        last = len(buf) - 1
+        n = max(0, int(np.floor((last - self._pos) / step)) + 1)
+        positions = self._pos + step * np.arange(n)
+        out = np.interp(positions, np.arange(len(buf)), buf)
+        # carry the last input sample and the next output position over to the next chunk
+        self._pos = self._pos + n * step - last
+        self._tail = buf[-1:]
+        return out
+
+    @staticmethod
+    def _to_pcm16(x: np.ndarray) -> bytes:
+        return np.clip(np.round(x), -32768, 32767).astype("<i2").tobytes()
+
+
+async def _ffmpeg_pcm(chunks: AsyncIterator[bytes], first: bytes) -> AsyncIterator[bytes]:
+    ffmpeg = shutil.which(os.environ.get("FFMPEG_BINARY", "ffmpeg"))
+    if ffmpeg is None:
+        raise UnsupportedAudio("only WAV can be decoded without ffmpeg on PATH")
+    proc = await asyncio.create_subprocess_exec(
+        ffmpeg, "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+    )
+
+    async def pump() -> None:
+        try:
+            proc.stdin.write(first)
+            await proc.stdin.drain()
+            async for chunk in chunks:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg gave up on the input; its exit status says why
+        finally:
+            proc.stdin.close()
+
+    writer = asyncio.ensure_future(pump())
+    try:
+        while True:
+            pcm = await proc.stdout.read(FEED_BYTES)
+            if not pcm:
+                break
+            yield pcm
+        await writer
+        if await proc.wait() != 0:
+            raise UnsupportedAudio("ffmpeg could not decode the audio")
+    finally:
+        writer.cancel()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+
+async def decode_pcm(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """16 kHz mono PCM16 from an encoded audio byte stream, chunk by chunk."""
+    first = b""
+    async for chunk in chunks:
+        first += chunk
+        if len(first) >= 12:
+            break
+    if not first:
+        return
+    if first[:4] == b"RIFF" and first[8:12] == b"WAVE":
+        decoder = WavDecoder()
+        pcm = decoder.feed(first)
+        if pcm:
+            yield pcm
+        async for chunk in chunks:
+            pcm = decoder.feed(chunk)
+            if pcm:
+                yield pcm
+        return
+    async for pcm in _ffmpeg_pcm(chunks, first):
+        yield pcm
+
+
+async def transcribe(engine: SpeechEngine, chunks: AsyncIterator[bytes], language: str,
+                     decode: Optional[bool] = None) -> Dict[str, Any]:
+    """Decode and recognise an audio byte stream as it arrives.
+
+    Returns text, confidence, duration (seconds of audio) and
+    processing_time. Raises UnsupportedAudio for undecodable input. Audio is
+    only decoded when the engine needs it, unless ``decode`` says otherwise.
+    """
+    start = time.perf_counter()
+    session = engine.session(language)
+    pcm_bytes = 0
+    if engine.needs_audio if decode is None else decode:
+        pending = bytearray()
+        async for pcm in decode_pcm(chunks):
+            pcm_bytes += len(pcm)
+            pending += pcm
+            if len(pending) >= FEED_BYTES:
+                await run_in_threadpool(session.accept, bytes(pending))
+                pending.clear()
+        if pending:
+            await run_in_threadpool(session.accept, bytes(pending))
+        text, confidence = await run_in_threadpool(session.result)
+    else:
+        async for _ in chunks:
+            pass
+        text, confidence = session.result()
+    return {
+        "text": text,
+        "confidence": round(confidence, 3),
+        "duration": round(pcm_bytes / (2 * SAMPLE_RATE), 3),
+        "processing_time": round(time.perf_counter() - start, 3),
+    }
+
+
+async def _iter_file(path: str, chunk_size: int) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Transcribe audio files and report the real-time factor")
+    parser.add_argument("command", choices=("transcribe", "bench"))
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--language", default="ml")
+    parser.add_argument("--chunk-kb", type=int, default=64, help="upload chunk size fed to the decoder")
+    args = parser.parse_args(argv)
+
+    engine = engine_from_env()
+    total_audio = total_time = 0.0
+    for path in args.files:
+        chunks = _iter_file(path, args.chunk_kb * 1024)
+        result = asyncio.run(transcribe(engine, chunks, args.language, decode=True))
+        total_audio += result["duration"]
+        total_time += result["processing_time"]
+        if args.command == "transcribe":
+            print(f"{path}: {result['text']} ({result['confidence']:.2f})")
+        else:
+            rtf = result["processing_time"] / result["duration"] if result["duration"] else float("nan")
+            print(f"{path}: {result['duration']:.1f}s audio in {result['processing_time']:.2f}s, RTF {rtf:.3f}")
+    if args.command == "bench" and total_audio:
+        print(f"{engine.name}: {total_audio:.1f}s audio, RTF {total_time / total_audio:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import re
+import unicodedata
+from typing import List
+
+# Zero-width characters that only affect rendering (ZWSP, ZWNJ, ZWJ, WJ, BOM)
+_ZERO_WIDTH = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"), None)
+
+# Legacy chillu sequences (consonant + virama + ZWJ) -> atomic chillu letters
+_CHILLU = {
+    "\u0d23\u0d4d\u200d": "\u0d7a",
+    "\u0d28\u0d4d\u200d": "\u0d7b",
+    "\u0d30\u0d4d\u200d": "\u0d7c",
+    "\u0d32\u0d4d\u200d": "\u0d7d",
+    "\u0d33\u0d4d\u200d": "\u0d7e",
+    "\u0d15\u0d4d\u200d": "\u0d7f",
+}
+_CHILLU_RE = re.compile("|".join(_CHILLU))
+
+_MALAYALAM_RE = re.compile("[\u0d00-\u0d7f]")
+
+
+def normalize_text(text: str) -> str:
+    """NFC-normalise, fold legacy chillu forms, drop zero-width marks and
+    replace punctuation/symbols with spaces."""
+    text = unicodedata.normalize("NFC", text)
+    text = _CHILLU_RE.sub(lambda m: _CHILLU[m.group(0)], text)
+    text = text.translate(_ZERO_WIDTH).casefold()
+    return "".join(" " if unicodedata.category(c)[0] in "PS" else c for c in text)
+
+
+def tokenize(text: str, ngram: int = 3) -> List[str]:
+    """Split normalised text into word tokens.
+
+    Malayalam words are agglutinative (വാഴയുടെ, വാഴയിൽ, വാഴകൾ all share the
+    stem വാഴ), so besides the full word we also emit its character n-grams,
+    letting inflected forms match on the shared stem.
+    """
+    tokens: List[str] = []
+    for word in normalize_text(text).split():
+        tokens.append(word)
+        if ngram > 0 and len(word) > ngram and _MALAYALAM_RE.search(word):
+            tokens.extend(word[i:i + ngram] for i in range(len(word) - ngram + 1))
+    return tokens
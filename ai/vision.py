@@ -0,0 +1,366 @@
+"""Image classification backends for ``/ai/process-image``.
+
+``IMAGE_BACKEND`` picks the backend:
+
+- ``hf``: the Hugging Face Inference API (``HF_API_TOKEN``, ``HF_IMAGE_MODEL``)
+- ``local``: an in-process CPU model loaded once from ``ML_MODEL_PATH``. A
+  ``.npz`` file holds a small NumPy MLP; a ``.onnx`` file runs on onnxruntime
+  when that is installed.
+- ``demo``: the bundled demo model below, loaded like ``local``
+- ``auto`` (default): ``local`` if ``ML_MODEL_PATH`` names an existing file,
+  otherwise ``hf``
+
+``local`` without a model file at ``ML_MODEL_PATH`` is a configuration
+error; the demo model is only used when asked for by name.
+
+Local models decode and resize images with Pillow. Images arriving within
+``IMAGE_BATCH_WINDOW_MS`` of each other share one forward pass.
+
+``ai/models/leaf_demo.npz`` is a tiny bundled model for offline checks. It
+tells green, brown and yellow leaves apart by colour and is no agronomic
+classifier. Select it with ``IMAGE_BACKEND=demo``; rebuild it with
+``python -m ai.vision --build-demo PATH``.
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+import numpy as np
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from ai.coalesce import MicroBatcher
+
+try:
+    import onnxruntime as ort
+except Exception:
+    ort = None
+
+DEMO_MODEL_PATH = Path(__file__).with_name("models") / "leaf_demo.npz"
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def analysis_result(label: Optional[str], confidence: float, model: str) -> Dict[str, Any]:
+    return {
+        "status": "success",
+        "disease_detected": label,
+        "confidence": confidence,
+        "treatment_suggestions": [],
+        "message": "",
+        "model": model,
+    }
+
+
+class ImageClassifier:
+    """Backend interface: ``classify_batch`` is blocking, ``aclassify`` is what the endpoint awaits."""
+
+    name = "none"
+
+    def classify_batch(self, images: Sequence[bytes]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def aclassify(self, image: bytes) -> Dict[str, Any]:
+        return (await run_in_threadpool(self.classify_batch, [image]))[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class HuggingFaceClassifier(ImageClassifier):
+    """Remote classification via the Hugging Face Inference API, one request per image.
+
+    ``aclassify`` uses a pooled ``httpx.AsyncClient`` (one per event loop), so
+    a slow or cold model never blocks the worker's other requests.
+    """
+
+    name = "huggingface"
+
+    def __init__(self, token: Optional[str], model_id: str = "microsoft/resnet-50", timeout: float = 60.0,
+                 pool_size: int = 20):
+        self.token = token
+        self.model_id = model_id
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, 5.0))
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def url(self) -> str:
+        return f"https://api-inference.huggingface.co/models/{self.model_id}"
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def _no_token(self) -> Dict[str, Any]:
+        # Fallback response when token not provided
+        return {
+            "status": "success",
+            "disease_detected": None,
+            "confidence": 0.0,
+            "treatment_suggestions": [],
+            "message": "Hugging Face token not configured. Set HF_API_TOKEN to enable image analysis.",
+        }
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._client_loop = loop
+        return self._client
+
+    async def aclassify(self, image: bytes) -> Dict[str, Any]:
+        if not self.token:
+            return self._no_token()
+        try:
+            resp = await self.client().post(self.url, headers=self.headers, content=image)
+            return self.handle(resp)
+        except Exception as e:
+            return {"status": "error", "message": f"Image analysis failed: {e}"}
+
+    def classify_batch(self, images: Sequence[bytes]) -> List[Dict[str, Any]]:
+        if not self.token:
+            return [self._no_token() for _ in images]
+        results = []
+        with httpx.Client(timeout=self.timeout) as client:
+            for image in images:
+                try:
+                    results.append(self.handle(client.post(self.url, headers=self.headers, content=image)))
+                except Exception as e:
+                    results.append({"status": "error", "message": f"Image analysis failed: {e}"})
+        return results
+
+    def handle(self, resp: httpx.Response) -> Dict[str, Any]:
+        if resp.status_code == 503:
+            # Model loading; return informative message
+            data = resp.json()
+            return {
+                "status": "loading",
+                "message": data.get("error", "Model loading"),
+            }
+        resp.raise_for_status()
+        return self.parse(resp.json())
+
+    def parse(self, data: Any) -> Dict[str, Any]:
+        # Response formats can vary; handle common classification schema
+        top_label = None
+        top_score = None
+        if isinstance(data, list) and data and isinstance(data[0], list):
+            # Some endpoints return list[list[{label, score}, ...]]
+            preds = data[0]
+        else:
+            preds = data
+        if isinstance(preds, list) and preds:
+            best = max(preds, key=lambda x: x.get("score", 0))
+            top_label = best.get("label")
+            top_score = float(best.get("score", 0.0))
+        return analysis_result(top_label, top_score if top_score is not None else 0.0, self.name)
+
+
+class LocalClassifier(ImageClassifier):
+    """In-process model: Pillow decode + resize, then one forward pass per micro-batch."""
+
+    def __init__(self, labels: Sequence[str], input_size: int, mean: Sequence[float], std: Sequence[float],
+                 batch_window: float = 0.005, max_batch: int = 16):
+        self.labels = [str(label) for label in labels]
+        self.input_size = int(input_size)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.std = np.asarray(std, dtype=np.float32)
+        self._batcher = MicroBatcher(self.classify_batch, window=batch_window, max_batch=max_batch)
+        self.images = 0
+        self.forward_seconds = 0.0
+
+    async def aclassify(self, image: bytes) -> Dict[str, Any]:
+        return await self._batcher.submit(image)
+
+    def decode(self, contents: bytes) -> np.ndarray:
+        """HWC float32 in model units; raises OSError for unreadable images."""
+        size = (self.input_size, self.input_size)
+        with Image.open(io.BytesIO(contents)) as img:
+            img.draft("RGB", size)
+            img = ImageOps.exif_transpose(img).convert("RGB").resize(size, Image.BILINEAR)
+        return (np.asarray(img, dtype=np.float32) / 255.0 - self.mean) / self.std
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        """(N, H, W, C) -> (N, classes) probabilities."""
+        raise NotImplementedError
+
+    def classify_batch(self, images: Sequence[bytes]) -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = []
+        arrays, slots = [], []
+        for contents in images:
+            try:
+                arrays.append(self.decode(contents))
+                slots.append(len(results))
+                results.append({})
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                results.append({"status": "error", "message": f"Image analysis failed: unreadable image ({e})"})
+        if arrays:
+            start = time.perf_counter()
+            probs = self.forward(np.stack(arrays))
+            self.forward_seconds += time.perf_counter() - start
+            self.images += len(arrays)
+            best = probs.argmax(axis=1)
+            for slot, i, p in zip(slots, best, probs):
+                results[slot] = analysis_result(self.labels[i], round(float(p[i]), 4), self.name)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "labels": len(self.labels),
+            "input_size": self.input_size,
+            "images": self.images,
+            "forward_seconds": round(self.forward_seconds, 3),
+            "batching": self._batcher.stats(),
+        }
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+class NumpyClassifier(LocalClassifier):
+    """MLP stored as ``.npz``: ``labels``, ``input_size``, ``mean``, ``std`` and layers ``W0, b0, W1, b1, ...``
+
+    Inputs are flattened HWC pixels; hidden layers use ReLU.
+    """
+
+    name = "numpy"
+
+    def __init__(self, path: os.PathLike, **kwargs: Any):
+        with np.load(path, allow_pickle=False) as z:
+            self.layers = []
+            while f"W{len(self.layers)}" in z:
+                i = len(self.layers)
+                self.layers.append((z[f"W{i}"].astype(np.float32), z[f"b{i}"].astype(np.float32)))
+            super().__init__(z["labels"], int(z["input_size"]), z["mean"], z["std"], **kwargs)
+        if not self.layers or self.layers[-1][0].shape[1] != len(self.labels):
+            raise ValueError(f"{path}: last layer does not match {len(self.labels)} labels")
+        self.name = f"numpy:{Path(path).stem}"
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        x = batch.reshape(len(batch), -1)
+        for i, (w, b) in enumerate(self.layers):
+            x = x @ w + b
+            if i < len(self.layers) - 1:
+                np.maximum(x, 0, out=x)
+        return _softmax(x)
+
+
+class OnnxClassifier(LocalClassifier):
+    """ONNX image classifier (NCHW float input) on onnxruntime's CPU provider.
+
+    Labels come from ``<model>.labels.txt`` (one per line) or the model's
+    ``labels`` metadata (comma-separated). Inputs are ImageNet-normalised.
+    """
+
+    def __init__(self, path: os.PathLike, **kwargs: Any):
+        if ort is None:
+            raise RuntimeError("onnxruntime is not installed; pip install onnxruntime or use a .npz model")
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = int(os.environ.get("IMAGE_ONNX_THREADS", "0"))
+        self.session = ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        side = inp.shape[-1] if isinstance(inp.shape[-1], int) else 224
+        labels_file = Path(path).with_suffix(".labels.txt")
+        if labels_file.exists():
+            labels = [line.strip() for line in labels_file.read_text(encoding="utf-8").splitlines() if line.strip()]
+        else:
+            meta = self.session.get_modelmeta().custom_metadata_map.get("labels", "")
+            labels = [label.strip() for label in meta.split(",") if label.strip()]
+        if not labels:
+            raise ValueError(f"{path}: no labels (add {labels_file.name} or 'labels' metadata)")
+        super().__init__(labels, side, IMAGENET_MEAN, IMAGENET_STD, **kwargs)
+        self.name = f"onnx:{Path(path).stem}"
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        out = self.session.run(None, {self.input_name: np.ascontiguousarray(batch.transpose(0, 3, 1, 2))})[0]
+        out = out.reshape(len(batch), -1)
+        # most exported classifiers return logits; leave real probability outputs alone
+        if out.min() < 0 or not np.allclose(out.sum(axis=1), 1.0, atol=1e-3):
+            out = _softmax(out)
+        return out
+
+
+def load_local_classifier(path: os.PathLike, **kwargs: Any) -> LocalClassifier:
+    if str(path).endswith(".onnx"):
+        return OnnxClassifier(path, **kwargs)
+    return NumpyClassifier(path, **kwargs)
+
+
+def classifier_from_env() -> ImageClassifier:
+    backend = os.environ.get("IMAGE_BACKEND", "auto").lower()
+    model_path = os.environ.get("ML_MODEL_PATH")
+    if backend == "auto":
+        backend = "local" if model_path and os.path.isfile(model_path) else "hf"
+    if backend == "local" and not (model_path and os.path.isfile(model_path)):
+        # never fall back to the demo model silently: its labels are not a diagnosis
+        raise ValueError(
+            f"IMAGE_BACKEND=local needs ML_MODEL_PATH to name a model file (got {model_path!r}); "
+            "use IMAGE_BACKEND=demo for the bundled demo model"
+        )
+    if backend in ("local", "demo"):
+        return load_local_classifier(
+            model_path if backend == "local" else DEMO_MODEL_PATH,
+            batch_window=float(os.environ.get("IMAGE_BATCH_WINDOW_MS", "5")) / 1000,
+            max_batch=int(os.environ.get("IMAGE_BATCH_MAX", "16")),
+        )
+    if backend != "hf":
+        raise ValueError(f"Unknown IMAGE_BACKEND {backend!r}; expected auto, local, demo or hf")
+    return HuggingFaceClassifier(
+        os.environ.get("HF_API_TOKEN"),
+        os.environ.get("HF_IMAGE_MODEL", "microsoft/resnet-50"),
+        timeout=float(os.environ.get("HF_TIMEOUT", "60")),
+        pool_size=int(os.environ.get("HF_POOL_SIZE", "20")),
+    )
+
+
+def build_demo_model(path: os.PathLike) -> Path:
+    """Write the bundled colour-based demo model: mean leaf colour -> healthy / blight / yellowing."""
+    side = 8
+    labels = np.array(["Healthy", "Leaf blight", "Leaf yellowing"])
+    # weights on the mean (R, G, B) of the image, per label
+    colour = np.array([[-1.0, 2.0, -1.0], [3.0, -2.0, -1.0], [1.0, 1.0, -2.0]], dtype=np.float32) * 8
+    w = np.tile(colour.T, (side * side, 1)) / (side * side)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        path, labels=labels, input_size=np.int32(side), mean=np.zeros(3, np.float32), std=np.ones(3, np.float32),
+        W0=w.astype(np.float32), b0=np.zeros(len(labels), np.float32),
+    )
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Classify images with the local model")
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--model", default=os.environ.get("ML_MODEL_PATH") or str(DEMO_MODEL_PATH))
+    parser.add_argument("--build-demo", metavar="PATH", help="write the bundled demo model to PATH and exit")
+    args = parser.parse_args(argv)
+    if args.build_demo:
+        print(f"Wrote {build_demo_model(args.build_demo)}")
+        return 0
+    classifier = load_local_classifier(args.model)
+    images = [Path(p).read_bytes() for p in args.images]
+    start = time.perf_counter()
+    results = classifier.classify_batch(images)
+    elapsed = time.perf_counter() - start
+    for name, result in zip(args.images, results):
+        print(f"{name}: {result.get('disease_detected')} ({result.get('confidence', 0.0):.2f}) {result.get('message') or ''}")
+    if images:
+        print(f"{len(images)} images in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,29 @@
+import asyncio
+import hmac
+import json
 import os
+import threading
 import time
-import math
-from typing import List, Optional, Dict, Any
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from pathlib import Path
 from dotenv import dotenv_values
 
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
-
-
-class Document(BaseModel):
-    id: str
-    text: str
-    metadata: Dict[str, Any] = {}
+from ai.cache import AnswerCache, SemanticCache, answer_cache_key, district_of, normalise_query
+from ai.coalesce import MicroBatcher, SingleFlight
+from ai.llm import GeminiClient, LLMResult, genai
+from ai.phash import PerceptualCache
+from ai.ingest import IngestReport, ingest, iter_query_responses, iter_stream
+from ai.retrieval import Document, InMemoryRetriever, load_seed_knowledge
+from ai.scoring import make_scorer
+from ai.stt import UnsupportedAudio, engine_from_env, transcribe
+from ai.vision import classifier_from_env
 
 
 class AnswerRequest(BaseModel):
@@ -42,70 +46,6 @@ class AnswerResponse(BaseModel):
     escalated: bool = False
 
 
-def cosine_similarity(a: List[float], b: List[float]) -> float:
-    dot = sum(x * y for x, y in zip(a, b))
-    na = math.sqrt(sum(x * x for x in a))
-    nb = math.sqrt(sum(y * y for y in b))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
-
-
-class InMemoryRetriever:
-    def __init__(self, docs: List[Document]):
-        self.docs = docs
-        self.vocab: Dict[str, int] = {}
-        self.doc_vectors: List[List[float]] = []
-        self._build_index()
-
-    def _tokenize(self, text: str) -> List[str]:
-        return [t.lower() for t in text.split()]
-
-    def _vectorize(self, text: str) -> List[float]:
-        vec = [0.0] * len(self.vocab)
-        for token in self._tokenize(text):
-            if token not in self.vocab:
-                continue
-            vec[self.vocab[token]] += 1.0
-        return vec
-
-    def _build_index(self) -> None:
-        # build vocab
-        idx = 0
-        for d in self.docs:
-            for token in self._tokenize(d.text):
-                if token not in self.vocab:
-                    self.vocab[token] = idx
-                    idx += 1
-        # precompute doc vectors
-        self.doc_vectors = [self._vectorize(d.text) for d in self.docs]
-
-    def query(self, text: str, top_k: int = 3) -> List[Document]:
-        qv = self._vectorize(text)
-        scored = []
-        for i, dv in enumerate(self.doc_vectors):
-            score = cosine_similarity(qv, dv)
-            scored.append((score, i))
-        scored.sort(reverse=True)
-        results: List[Document] = []
-        for score, i in scored[:top_k]:
-            d = self.docs[i]
-            d.metadata = {**d.metadata, "similarity": float(score)}
-            results.append(d)
-        return results
-
-
-def load_seed_knowledge() -> List[Document]:
-    # Minimal seed; in a real app load from files/DB
-    seeds = [
-        ("pest_banana_leaf_spot", "For banana leaf spot (Sigatoka), use mancozeb or propiconazole as per label. Ensure proper sanitation and remove affected leaves.", {"crop": "Banana", "topic": "pest"}),
-        ("rice_blast", "Rice blast can be managed with tricyclazole; avoid excess nitrogen and maintain field hygiene.", {"crop": "Rice", "topic": "disease"}),
-        ("kerala_weather", "Check IMD Kerala district forecast; heavy rain June-Sep. Ensure drainage in low-lying fields.", {"topic": "weather"}),
-        ("schemes_subsidy", "For subsidies, refer to Kerala Department of Agriculture e-Krishi portal and PM-KISAN eligibility.", {"topic": "scheme"}),
-    ]
-    return [Document(id=i, text=t, metadata=m) for i, t, m in seeds]
-
-
 def build_prompt(req: AnswerRequest, contexts: List[Document]) -> str:
     sys_msg = (
         "You are Kerala Krishi AI, a helpful, reliable agricultural advisor. "
@@ -137,30 +77,7 @@ def build_prompt(req: AnswerRequest, contexts: List[Document]) -> str:
     )
 
 
-def call_gemini(prompt: str, language: str) -> str:
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if genai is None or not api_key:
-        if language == "ml":
-            return (
-                "ഇപ്പോൾ ഡീഫോൾട്ട് മറുപടി നൽകുന്നു. കൂടുതൽ കൃത്യമായ മറുപടി ലഭിക്കാൻ AI കീ ചേർക്കുക.\n"
-                "1) പൊതു നിർദ്ദേശം: വിള പരിപാലനം മെച്ചപ്പെടുത്തുക.\n2) സുരക്ഷ: ലേബൽപ്രകാരം മാത്രം കീടനാശിനി ഉപയോഗിക്കുക."
-            )
-        return (
-            "Default advisory. Add GOOGLE_API_KEY for live AI.\n"
-            "1) Improve crop management.\n2) Safety: Follow label directions strictly."
-        )
-    try:
-        genai.configure(api_key=api_key)
-        for model_name in ["gemini-1.5-flash"]:
-            try:
-                model = genai.GenerativeModel(model_name)
-                resp = model.generate_content(prompt)
-                if getattr(resp, 'text', None):
-                    return resp.text
-            except Exception:
-                continue
-    except Exception:
-        pass
+def default_advisory(language: str) -> str:
     if language == "ml":
         return (
             "ഇപ്പോൾ ഡീഫോൾട്ട് മറുപടി നൽകുന്നു. കൂടുതൽ കൃത്യമായ മറുപടി ലഭിക്കാൻ AI കീ ചേർക്കുക.\n"
@@ -193,7 +110,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-retriever = InMemoryRetriever(load_seed_knowledge())
+# One Gemini client per worker: configured once, model handles kept warm.
+# GEMINI_MODELS (comma-separated fallbacks), LLM_MAX_CONCURRENCY, LLM_MAX_ASYNC_CONCURRENCY,
+# LLM_TIMEOUT, LLM_QUEUE_TIMEOUT
+llm = GeminiClient.from_env()
+llm.configure()
+
+# Retrieval: RETRIEVER_SCORER = cosine | tfidf | bm25
+# KB_INDEX_PATH holds the persistent, memory-mapped knowledge index shared by all workers
+KB_INDEX_PATH = Path(os.environ.get("KB_INDEX_PATH") or Path(__file__).with_name("instance") / "kb_index")
+# Knowledge snippets retrieved per question
+RETRIEVER_TOP_K = int(os.environ.get("RETRIEVER_TOP_K", "3"))
+
+
+def load_retriever() -> InMemoryRetriever:
+    scorer = make_scorer(os.environ.get("RETRIEVER_SCORER", "cosine"))
+    ngram = int(os.environ.get("RETRIEVER_NGRAM", "3"))
+    if InMemoryRetriever.exists(KB_INDEX_PATH):
+        try:
+            return InMemoryRetriever.load(KB_INDEX_PATH, scorer=scorer, ngram=ngram)
+        except Exception as e:
+            print(f"Knowledge index at {KB_INDEX_PATH} unreadable, rebuilding from seed: {e}")
+    r = InMemoryRetriever(load_seed_knowledge(), scorer=scorer, ngram=ngram)
+    try:
+        r.save(KB_INDEX_PATH)
+    except OSError as e:
+        print(f"Could not persist knowledge index to {KB_INDEX_PATH}: {e}")
+    return r
+
+
+retriever = load_retriever()
+KB_REFRESH_INTERVAL = float(os.environ.get("KB_REFRESH_INTERVAL", "5"))
+_kb_checked_at = 0.0
+_kb_ingest_lock = threading.Lock()
+
+# Exact-match answer cache; ANSWER_CACHE_MAX_ENTRIES=0 disables it
+answer_cache = AnswerCache(
+    max_entries=int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "2048")),
+    max_bytes=int(os.environ.get("ANSWER_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    ttl=float(os.environ.get("ANSWER_CACHE_TTL", "86400")),
+)
+# Paraphrase cache over retriever query vectors; SEMANTIC_CACHE_MAX_ENTRIES=0 disables it
+semantic_cache = SemanticCache(
+    threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.85")),
+    max_entries=int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.environ.get("ANSWER_CACHE_TTL", "86400")),
+)
+
+
+def maybe_refresh_retriever() -> None:
+    """Pick up index generations saved by other workers (e.g. after ingestion)."""
+    global _kb_checked_at
+    now = time.time()
+    if now - _kb_checked_at < KB_REFRESH_INTERVAL:
+        return
+    _kb_checked_at = now
+    # an ingest in progress holds documents not yet saved; swapping in the on-disk generation would drop them
+    if not _kb_ingest_lock.acquire(blocking=False):
+        return
+    try:
+        retriever.refresh()
+    except Exception as e:
+        print(f"Knowledge index refresh failed: {e}")
+    finally:
+        _kb_ingest_lock.release()
 
 
 @app.get("/ai/debug")
@@ -208,115 +188,330 @@ def ai_debug():
         "hf_key_prefix": (hf_key[:6] + "...") if hf_key else None,
     }
 
-@app.post("/ai/answer", response_model=AnswerResponse)
-def ai_answer(req: AnswerRequest):
-    start = time.time()
-    contexts = retriever.query(req.query_text, top_k=3)
-    prompt = build_prompt(req, contexts)
-    answer = call_gemini(prompt, req.language)
+
+@app.get("/ai/metrics")
+def ai_metrics():
+    return {
+        "llm": llm.stats(),
+        "answer_cache": answer_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "coalescing": {"llm": llm_flights.stats(), "retrieval": prepare_batcher.stats()},
+        "image_classifier": image_classifier.stats(),
+        "image_cache": image_cache.stats(),
+        "knowledge_index": {"documents": len(retriever), "generation": retriever.index_generation},
+    }
+
+
+class PreparedAnswer:
+    """Everything ``/ai/answer`` needs before (or instead of) the LLM call."""
+
+    __slots__ = ("cached", "cache_key", "generation", "context", "qids", "qvec", "contexts", "prompt")
+
+    def __init__(self, cached: Optional[Dict[str, Any]] = None, **fields: Any):
+        self.cached = cached
+        for name in self.__slots__[1:]:
+            setattr(self, name, fields.get(name))
+
+
+def _cached_answer(req: AnswerRequest) -> PreparedAnswer:
+    district = district_of(req.farmer_location, req.farmer_context)
+    cache_key = answer_cache_key(req.query_text, req.language, req.crop_type, district)
+    generation = retriever.generation
+    cached = answer_cache.get(cache_key, generation)
+    if cached is not None:
+        return PreparedAnswer({**cached, "model_used": f"cache:{cached['model_used']}"})
+    context = ((req.crop_type or "").strip().casefold(), district)
+    qids, qvec = retriever.embed(req.query_text)
+    similar = semantic_cache.lookup(req.language, qids, qvec, context, generation)
+    if similar is not None:
+        cached = similar[0]
+        return PreparedAnswer({**cached, "model_used": f"semantic-cache:{cached['model_used']}"})
+    return PreparedAnswer(cache_key=cache_key, generation=generation, context=context, qids=qids, qvec=qvec)
+
+
+def prepare_answers(reqs: List[AnswerRequest]) -> List[PreparedAnswer]:
+    """Cache lookups, then one batched retrieval pass for the rest (CPU-bound; run off the event loop)."""
+    maybe_refresh_retriever()
+    preps = [_cached_answer(req) for req in reqs]
+    todo = [i for i, p in enumerate(preps) if p.cached is None]
+    texts = list(dict.fromkeys(reqs[i].query_text for i in todo))
+    if len(texts) == 1:
+        found = {texts[0]: retriever.query(texts[0], top_k=RETRIEVER_TOP_K)}
+    else:
+        found = dict(zip(texts, retriever.query_batch(texts, top_k=RETRIEVER_TOP_K)))
+    for i in todo:
+        preps[i].contexts = found[reqs[i].query_text]
+        preps[i].prompt = build_prompt(reqs[i], preps[i].contexts)
+    return preps
+
+
+# Requests arriving within RETRIEVAL_BATCH_WINDOW_MS of each other share one
+# prepare_answers pass (one vectorised retrieval call); 0 disables batching
+prepare_batcher = MicroBatcher(
+    prepare_answers,
+    window=float(os.environ.get("RETRIEVAL_BATCH_WINDOW_MS", "2")) / 1000,
+    max_batch=int(os.environ.get("RETRIEVAL_BATCH_MAX", "64")),
+)
+# Concurrent requests whose prompts normalise to the same text share one Gemini call
+llm_flights: SingleFlight[Optional[LLMResult]] = SingleFlight()
+
+
+def generate_shared(prompt: str) -> Awaitable[Optional[LLMResult]]:
+    return llm_flights.do(normalise_query(prompt), lambda: llm.agenerate(prompt))
+
+
+def finish_answer(req: AnswerRequest, prep: PreparedAnswer, generated: Optional[LLMResult],
+                  cache: bool = True) -> Dict[str, Any]:
     # naive confidence from top similarity
-    top_sim = float(contexts[0].metadata.get("similarity", 0.4)) if contexts else 0.4
+    top_sim = float(prep.contexts[0].metadata.get("similarity", 0.4)) if prep.contexts else 0.4
     escalated = top_sim < 0.15
-    return AnswerResponse(
-        response_text=answer,
-        model_used="gemini-pro-2.0",
-        confidence_score=max(0.3, min(0.95, top_sim + 0.3)),
-        processing_time=round(time.time() - start, 3),
-        escalated=escalated,
+    result = {
+        "response_text": generated.text if generated else default_advisory(req.language),
+        "model_used": generated.model if generated else "fallback",
+        "confidence_score": max(0.3, min(0.95, top_sim + 0.3)),
+        "escalated": escalated,
+    }
+    # never cache the offline fallback text, nor an answer whose stream was cut off
+    if generated is not None and cache:
+        answer_cache.put(prep.cache_key, result, prep.generation)
+        semantic_cache.store(req.language, prep.cache_key, prep.qids, prep.qvec, prep.context, result, prep.generation)
+    return result
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def unless_disconnected(request: Request, coro: Awaitable[Any], poll_interval: float = 0.5) -> Any:
+    """Await ``coro``, cancelling it if the client goes away first."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        task.cancel()
+
+
+@app.post("/ai/answer", response_model=AnswerResponse)
+async def ai_answer(req: AnswerRequest, request: Request):
+    start = time.time()
+    prep = await prepare_batcher.submit(req)
+    if prep.cached is not None:
+        return AnswerResponse(**prep.cached, processing_time=round(time.time() - start, 3))
+    try:
+        # leaving early only cancels the Gemini call if no other request shares it
+        generated = await unless_disconnected(request, generate_shared(prep.prompt))
+    except ClientDisconnected:
+        # nobody is waiting for the body; 499 is what nginx logs for this
+        return Response(status_code=499)
+    result = finish_answer(req, prep, generated)
+    return AnswerResponse(**result, processing_time=round(time.time() - start, 3))
+
+
+class BatchAnswerRequest(BaseModel):
+    requests: List[AnswerRequest]
+
+
+class BatchAnswerResponse(BaseModel):
+    results: List[AnswerResponse]
+    processing_time: float
+
+
+# Batch endpoint: ANSWER_BATCH_MAX requests per call, ANSWER_BATCH_CONCURRENCY LLM calls in flight per batch
+ANSWER_BATCH_MAX = int(os.environ.get("ANSWER_BATCH_MAX", "100"))
+ANSWER_BATCH_CONCURRENCY = int(os.environ.get("ANSWER_BATCH_CONCURRENCY", "8"))
+
+
+@app.post("/ai/answer/batch", response_model=BatchAnswerResponse)
+async def ai_answer_batch(batch: BatchAnswerRequest):
+    """Answer many requests at once (offline re-answering, SMS bursts); results come back in order.
+
+    Cached answers are served as usual. Retrieval for the rest runs as one
+    batched pass, and identical prompts go to the LLM only once. Gemini is
+    then called with bounded parallelism, sharing calls with concurrent
+    single requests for the same prompt.
+    """
+    start = time.time()
+    reqs = batch.requests
+    if len(reqs) > ANSWER_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {ANSWER_BATCH_MAX} requests per batch")
+    preps = await run_in_threadpool(prepare_answers, reqs)
+
+    prompts = list(dict.fromkeys(p.prompt for p in preps if p.cached is None))
+    slots = asyncio.Semaphore(ANSWER_BATCH_CONCURRENCY)
+
+    async def generate(prompt: str) -> Optional[LLMResult]:
+        async with slots:
+            return await generate_shared(prompt)
+
+    generated = dict(zip(prompts, await asyncio.gather(*(generate(p) for p in prompts))))
+    results = []
+    for req, prep in zip(reqs, preps):
+        result = prep.cached if prep.cached is not None else finish_answer(req, prep, generated[prep.prompt])
+        results.append(AnswerResponse(**result, processing_time=round(time.time() - start, 3)))
+    return BatchAnswerResponse(results=results, processing_time=round(time.time() - start, 3))
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/ai/answer/stream")
+async def ai_answer_stream(req: AnswerRequest):
+    """Server-sent events: ``chunk`` events with text as it is generated, then
+    one ``done`` event carrying the full AnswerResponse. ``truncated`` is set
+    on it when the Gemini stream broke off part-way; such an answer is sent
+    as it is but not cached."""
+    start = time.time()
+    prep = await prepare_batcher.submit(req)
+
+    async def events():
+        truncated = False
+        if prep.cached is not None:
+            result = prep.cached
+            yield sse_event("chunk", {"text": result["response_text"]})
+        else:
+            pieces, model, complete = [], None, False
+            async for model, piece in llm.astream(prep.prompt):
+                if piece is None:
+                    complete = True
+                    continue
+                pieces.append(piece)
+                yield sse_event("chunk", {"text": piece})
+            generated = LLMResult("".join(pieces), model, time.time() - start) if pieces else None
+            truncated = generated is not None and not complete
+            result = finish_answer(req, prep, generated, cache=not truncated)
+            if generated is None:
+                yield sse_event("chunk", {"text": result["response_text"]})
+        yield sse_event("done", {**result, "truncated": truncated, "processing_time": round(time.time() - start, 3)})
+
+    # starlette cancels the generator (and with it the Gemini stream) if the client disconnects
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
-@app.post("/ai/voice-to-text")
-async def ai_voice_to_text(
-    audio: UploadFile = File(...),
-    language: str = Form("ml"),
-):
-    # Stub: In production, call STT service
-    filename = audio.filename
-    text_ml = "ഓഡിയോ ട്രാൻസ്ക്രിപ്ഷൻ സജ്ജമല്ല. താൽക്കാലിക മറുപടി."  # temporary
-    text_en = "Voice transcription service not configured. Returning placeholder."
+# Speech-to-text engine: STT_BACKEND = auto | vosk | null (see ai/stt.py)
+speech_engine = engine_from_env()
+AUDIO_MAX_BYTES = int(os.environ.get("AUDIO_MAX_BYTES", str(25 * 1024 * 1024)))
+
+
+async def capped(chunks: AsyncIterator[bytes], limit: int) -> AsyncIterator[bytes]:
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if total > limit:
+            raise HTTPException(status_code=413, detail=f"Upload larger than {limit} bytes")
+        yield chunk
+
+
+async def iter_upload(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def transcribe_audio(chunks: AsyncIterator[bytes], language: str, filename: Optional[str]) -> Dict[str, Any]:
+    try:
+        result = await transcribe(speech_engine, capped(chunks, AUDIO_MAX_BYTES), language)
+    except UnsupportedAudio as e:
+        raise HTTPException(status_code=415, detail=str(e))
     return {
         "status": "success",
-        "text": text_ml if language == "ml" else text_en,
+        **result,
         "language": language,
         "filename": filename,
-        "confidence": 0.5,
+        "model": speech_engine.name,
     }
 
 
+@app.post("/ai/voice-to-text")
+async def ai_voice_to_text(
+    audio: UploadFile = File(...),
+    language: str = Form("ml"),
+):
+    return await transcribe_audio(iter_upload(audio), language, audio.filename)
+
+
+@app.post("/ai/voice-to-text/stream")
+async def ai_voice_to_text_stream(request: Request, language: str = "ml", filename: Optional[str] = None):
+    """Raw audio request body (WAV, or anything ffmpeg reads), recognised while it is still arriving."""
+    return await transcribe_audio(request.stream(), language, filename)
+
+
+# Image analysis backend: IMAGE_BACKEND = auto | local | demo | hf (see ai/vision.py)
+image_classifier = classifier_from_env()
+# Near-duplicate photos (re-shared, recompressed, lightly cropped) reuse an earlier result;
+# IMAGE_CACHE_MAX_ENTRIES=0 disables it
+image_cache = PerceptualCache(
+    max_distance=int(os.environ.get("IMAGE_CACHE_MAX_DISTANCE", "8")),
+    max_entries=int(os.environ.get("IMAGE_CACHE_MAX_ENTRIES", "4096")),
+    ttl=float(os.environ.get("IMAGE_CACHE_TTL", "86400")),
+    algorithm=os.environ.get("IMAGE_HASH", "phash"),
+)
+
+
+# Largest image accepted by /ai/process-image; the Flask app already caps requests at 16 MB
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", str(16 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+async def read_upload(upload: UploadFile, limit: int) -> bytes:
+    """Read an upload chunk by chunk, failing with 413 as soon as it passes ``limit`` bytes."""
+    buf = bytearray()
+    while True:
+        # the multipart parser spools large parts to disk; reads from there run in a thread
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return bytes(buf)
+        buf += chunk
+        if len(buf) > limit:
+            raise HTTPException(status_code=413, detail=f"Upload larger than {limit} bytes")
+
+
+@app.middleware("http")
+async def reject_oversized_images(request: Request, call_next):
+    # turn away declared-oversized uploads before their body is read at all
+    if request.url.path == "/ai/process-image":
+        try:
+            declared = int(request.headers.get("content-length", "0"))
+        except ValueError:
+            declared = 0
+        if declared > IMAGE_MAX_BYTES + 64 * 1024:  # room for multipart framing
+            return JSONResponse({"detail": f"Upload larger than {IMAGE_MAX_BYTES} bytes"}, status_code=413)
+    return await call_next(request)
+
+
 @app.post("/ai/process-image")
 async def ai_process_image(image: UploadFile = File(...)):
-    # Use Hugging Face Inference API for image classification
-    # Configure via env:
-    #   HF_API_TOKEN: personal access token
-    #   HF_IMAGE_MODEL: model repo id (default: microsoft/resnet-50)
     try:
-        contents = await image.read()
+        contents = await read_upload(image, IMAGE_MAX_BYTES)
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=400, detail="Unable to read image upload")
 
-    hf_token = os.environ.get("HF_API_TOKEN")
-    model_id = os.environ.get("HF_IMAGE_MODEL", "microsoft/resnet-50")
-
     if not contents:
         raise HTTPException(status_code=400, detail="Empty image content")
 
-    if not hf_token:
-        # Fallback response when token not provided
-        return {
-            "status": "success",
-            "disease_detected": None,
-            "confidence": 0.0,
-            "treatment_suggestions": [],
-            "message": "Hugging Face token not configured. Set HF_API_TOKEN to enable image analysis.",
-        }
-
-    try:
-        import requests  # already in requirements
-
-        headers = {
-            "Authorization": f"Bearer {hf_token}",
-        }
-        resp = requests.post(
-            f"https://api-inference.huggingface.co/models/{model_id}",
-            headers=headers,
-            data=contents,
-            timeout=60,
-        )
-        if resp.status_code == 503:
-            # Model loading; return informative message
-            data = resp.json()
-            return {
-                "status": "loading",
-                "message": data.get("error", "Model loading"),
-            }
-        resp.raise_for_status()
-        data = resp.json()
-        # Response formats can vary; handle common classification schema
-        top_label = None
-        top_score = None
-        if isinstance(data, list) and data and isinstance(data[0], list):
-            # Some endpoints return list[list[{label, score}, ...]]
-            preds = data[0]
-        else:
-            preds = data
-        if isinstance(preds, list) and preds:
-            best = max(preds, key=lambda x: x.get("score", 0))
-            top_label = best.get("label")
-            top_score = float(best.get("score", 0.0))
-
-        return {
-            "status": "success",
-            "disease_detected": top_label,
-            "confidence": top_score if top_score is not None else 0.0,
-            "treatment_suggestions": [],
-            "message": "",
-        }
-    except Exception as e:
-        return {
-            "status": "error",
-            "message": f"Image analysis failed: {e}",
-        }
+    key = await run_in_threadpool(image_cache.hash, contents) if image_cache.enabled else None
+    if key is not None:
+        hit = image_cache.lookup(key)
+        if hit is not None:
+            cached, distance = hit
+            return {**cached, "model": f"phash-cache:{cached.get('model')}", "hash_distance": distance}
+    result = await image_classifier.aclassify(contents)
+    # only real labels; 'loading', errors and the no-token placeholder are not worth keeping
+    if key is not None and result.get("status") == "success" and result.get("disease_detected"):
+        image_cache.store(key, result)
+    return result
 
 
 class FeedbackRequest(BaseModel):
@@ -344,6 +539,40 @@ def ai_escalate(req: EscalationRequest):
     return {"status": "queued", "ticket_id": ticket_id}
 
 
+@app.post("/ai/kb/ingest", response_model=IngestReport)
+def ai_kb_ingest(
+    file: Optional[UploadFile] = File(None),
+    format: str = Form("auto"),
+    include_query_responses: bool = Form(False),
+    x_admin_token: Optional[str] = Header(None),
+):
+    # Admin only: requires KB_ADMIN_TOKEN to be set and sent as X-Admin-Token
+    admin_token = os.environ.get("KB_ADMIN_TOKEN")
+    if not admin_token or not hmac.compare_digest(x_admin_token or "", admin_token):
+        raise HTTPException(status_code=403, detail="Knowledge-base ingestion not permitted")
+    if file is None and not include_query_responses:
+        raise HTTPException(status_code=400, detail="Provide a file and/or include_query_responses")
+    fmt = format
+    if file is not None and fmt == "auto":
+        fmt = "csv" if (file.filename or "").lower().endswith(".csv") else "jsonl"
+    if fmt not in ("jsonl", "csv"):
+        raise HTTPException(status_code=400, detail="format must be auto, jsonl or csv")
+
+    def records():
+        if file is not None:
+            source = Path(file.filename or "upload").stem
+            yield from ((r, source) for r in iter_stream(file.file, fmt))
+        if include_query_responses:
+            db_url = os.environ.get("DATABASE_URL") or f"sqlite:///{Path(__file__).with_name('instance') / 'farmer_support.db'}"
+            yield from ((r, "farmer_queries") for r in iter_query_responses(db_url))
+
+    with _kb_ingest_lock:
+        retriever.refresh()
+        report = ingest(retriever, records(), workers=int(os.environ.get("KB_INGEST_WORKERS", "1")))
+        retriever.save()
+    return report
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,7 +1,7 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_migrate import Migrate
+from flask_migrate import Migrate, stamp, upgrade
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from datetime import datetime, timezone
@@ -21,8 +21,13 @@ app = Flask(__name__)
 env = os.environ.get('FLASK_ENV', 'development')
 app.config.from_object(config.get(env, 'default'))
 
+# Pool settings per database backend; SQLite gets WAL and a busy timeout (services/database.py)
+from services.database import SQLiteTuning, engine_options
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
 # Initialize extensions
 db = SQLAlchemy(app)
+sqlite_tuning = SQLiteTuning(app, db)
 migrate = Migrate(app, db)
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -33,15 +38,21 @@ login_manager.login_message = 'Please log in to access this page.'
 from models.user import create_user_model
 from models.query import create_farmer_query_model
 from models.response import create_query_response_model
+from models.upload import create_upload_model
+from models.farmer_stats import create_farmer_stats_model
 
 User = create_user_model(db)
 FarmerQuery = create_farmer_query_model(db)
 QueryResponse = create_query_response_model(db)
+Upload = create_upload_model(db)
+FarmerStats = create_farmer_stats_model(db)
 
 # Make models available globally
 app.User = User
 app.FarmerQuery = FarmerQuery
 app.QueryResponse = QueryResponse
+app.Upload = Upload
+app.FarmerStats = FarmerStats
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -67,6 +78,19 @@ def contact():
     """Contact page route"""
     return render_template('contact.html')
 
+@app.route('/health')
+def health():
+    """Liveness plus AI service circuit breaker state"""
+    breakers = app.ai_client.health()
+    degraded = any(b['state'] != 'closed' for b in breakers.values())
+    return jsonify({
+        'status': 'degraded' if degraded else 'ok',
+        'ai_service': {
+            'url': app.ai_client.base_url,
+            'circuits': breakers
+        }
+    })
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -81,6 +105,8 @@ def internal_error(error):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+app.allowed_file = allowed_file
+
 # Context processors
 @app.context_processor
 def inject_models():
@@ -188,6 +214,30 @@ def format_ai_response(text: str) -> Markup:
 
 app.jinja_env.filters['format_ai_response'] = format_ai_response
 
+# Downscaling / re-encoding of uploaded photos in a process pool
+from services.images import ImagePipeline, thumbnail_path
+image_pipeline = ImagePipeline(app)
+
+def upload_thumbnail(image_path):
+    """Static filename of an upload's thumbnail, or of the image itself if it has none"""
+    thumb = thumbnail_path(image_path)
+    if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], thumb)):
+        return 'uploads/' + thumb
+    return 'uploads/' + image_path
+
+app.jinja_env.filters['upload_thumbnail'] = upload_thumbnail
+
+# Pooled keep-alive client for the AI microservice (app.ai_client)
+from services.ai_client import AIServiceClient
+ai_client = AIServiceClient(app)
+
+# Background worker pool that answers submitted queries
+from services.jobs import QueryJobQueue
+ai_jobs = QueryJobQueue(app)
+
+from services.stats import FarmerStatsCounter
+farmer_stats = FarmerStatsCounter(app)
+
 # Import and register routes AFTER creating models
 from routes.auth import auth_bp
 from routes.dashboard import dashboard_bp  
@@ -201,10 +251,14 @@ if __name__ == '__main__':
     # Create upload folder if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
-    # Create database tables
+    # Bring the database schema up to date (migrations/)
     with app.app_context():
-        db.create_all()
-        print("✅ Database tables created successfully!")
+        tables = set(db.inspect(db.engine).get_table_names())
+        if 'users' in tables and 'alembic_version' not in tables:
+            # made by db.create_all() before migrations existed: mark what it already has
+            stamp(revision='3f0b7c2d91e6' if 'uploads' in tables else '69398f2592fc')
+        upgrade()
+        print("✅ Database schema is up to date!")
     
     print("🌾 Kerala Krishi AI - Starting server...")
     print("🔗 Access the application at: http://localhost:5000")
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+def create_farmer_stats_model(db):
+    """Factory function to create FarmerStats model with db instance"""
+    
+    class FarmerStats(db.Model):
+        """Per-farmer query counters for the profile page, kept in step by services/stats.py"""
+        __tablename__ = 'farmer_stats'
+        
+        farmer_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+        
+        # Query Counters
+        total_queries = db.Column(db.Integer, default=0, nullable=False)
+        open_queries = db.Column(db.Integer, default=0, nullable=False)  # pending or processing
+        answered_queries = db.Column(db.Integer, default=0, nullable=False)
+        escalated_queries = db.Column(db.Integer, default=0, nullable=False)
+        
+        # Timestamps
+        updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+        
+        def to_dict(self):
+            """Convert stats object to dictionary"""
+            return {
+                'farmer_id': self.farmer_id,
+                'total_queries': self.total_queries,
+                'open_queries': self.open_queries,
+                'answered_queries': self.answered_queries,
+                'escalated_queries': self.escalated_queries,
+                'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            }
+        
+        def __repr__(self):
+            return f'<FarmerStats {self.farmer_id}: {self.total_queries} queries>'
+    
+    return FarmerStats
\ No newline at end of file
@@ -6,6 +6,13 @@ def create_farmer_query_model(db):
     class FarmerQuery(db.Model):
         """Model to store farmer queries"""
         __tablename__ = 'farmer_queries'
+        __table_args__ = (
+            # dashboard: a farmer's queries newest first, and counts per status
+            db.Index('ix_farmer_queries_farmer_created', 'farmer_id', 'created_at'),
+            db.Index('ix_farmer_queries_farmer_status', 'farmer_id', 'status'),
+            # background jobs: pending / stale 'processing' rows (services/jobs.py)
+            db.Index('ix_farmer_queries_status_created', 'status', 'created_at'),
+        )
         
         id = db.Column(db.Integer, primary_key=True)
         
@@ -30,6 +37,7 @@ def create_farmer_query_model(db):
         # Query Status
         status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, answered, escalated
         confidence_score = db.Column(db.Float, nullable=True)  # AI confidence in answer
+        response_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # kept in step by services/stats.py
         
         # Timestamps
         created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -60,6 +68,7 @@ def create_farmer_query_model(db):
                 'urgency': self.urgency,
                 'status': self.status,
                 'confidence_score': self.confidence_score,
+                'response_count': self.response_count,
                 'created_at': self.created_at.isoformat() if self.created_at else None,
                 'updated_at': self.updated_at.isoformat() if self.updated_at else None,
                 'responses': [response.to_dict() for response in self.responses]
@@ -10,7 +10,7 @@ def create_query_response_model(db):
         id = db.Column(db.Integer, primary_key=True)
         
         # Foreign Keys
-        query_id = db.Column(db.Integer, db.ForeignKey('farmer_queries.id'), nullable=False)
+        query_id = db.Column(db.Integer, db.ForeignKey('farmer_queries.id'), nullable=False, index=True)
         
         # Response Information
         response_text = db.Column(db.Text, nullable=False)
@@ -0,0 +1,59 @@
+from datetime import datetime
+import json
+
+def create_upload_model(db):
+    """Factory function to create Upload model with db instance"""
+    
+    class Upload(db.Model):
+        """Content-addressed uploaded file, stored once per distinct SHA-256"""
+        __tablename__ = 'uploads'
+        
+        id = db.Column(db.Integer, primary_key=True)
+        
+        # Content Address
+        sha256 = db.Column(db.String(64), unique=True, nullable=False)
+        path = db.Column(db.String(255), nullable=False, index=True)  # relative to UPLOAD_FOLDER, e.g. cas/ab/cd/abcd....jpg
+        size = db.Column(db.Integer, nullable=False)
+        mimetype = db.Column(db.String(100), nullable=True)
+        original_filename = db.Column(db.String(255), nullable=True)  # name of the first upload
+        
+        # AI Image Analysis (JSON from /ai/process-image), reused for duplicate uploads
+        analysis = db.Column(db.Text, nullable=True)
+        analysed_at = db.Column(db.DateTime, nullable=True)
+        
+        # Timestamps
+        created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+        
+        def __init__(self, sha256, path, size, mimetype=None, original_filename=None):
+            self.sha256 = sha256
+            self.path = path
+            self.size = size
+            self.mimetype = mimetype
+            self.original_filename = original_filename
+        
+        def get_analysis(self):
+            """Stored analysis dict, or None if the image has not been analysed yet"""
+            return json.loads(self.analysis) if self.analysis else None
+        
+        def set_analysis(self, data):
+            self.analysis = json.dumps(data, ensure_ascii=False)
+            self.analysed_at = datetime.utcnow()
+        
+        def to_dict(self):
+            """Convert upload object to dictionary"""
+            return {
+                'id': self.id,
+                'sha256': self.sha256,
+                'path': self.path,
+                'size': self.size,
+                'mimetype': self.mimetype,
+                'original_filename': self.original_filename,
+                'analysis': self.get_analysis(),
+                'analysed_at': self.analysed_at.isoformat() if self.analysed_at else None,
+                'created_at': self.created_at.isoformat() if self.created_at else None
+            }
+        
+        def __repr__(self):
+            return f'<Upload {self.sha256[:12]} {self.path}>'
+    
+    return Upload
\ No newline at end of file
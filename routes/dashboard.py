@@ -3,6 +3,11 @@ from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 import json
 
+from sqlalchemy.orm import selectinload
+
+from services.pagination import InvalidCursor, keyset_page
+from services.stats import query_stats
+
 dashboard_bp = Blueprint('dashboard', __name__)
 
 def refresh_current_user():
@@ -47,11 +52,8 @@ def profile():
     FarmerQuery = current_app.FarmerQuery
     User = current_app.User
     
-    # Force database session to get fresh data
-    db.session.expire_all()
-    
-    # Get fresh user data using the same method as the working test endpoints
-    fresh_user = User.query.filter_by(id=current_user.id).first()
+    # current_user was loaded by this request's session, so this is an identity-map hit
+    fresh_user = db.session.get(User, current_user.id)
     if not fresh_user:
         flash('User not found', 'error')
         return redirect(url_for('auth.login'))
@@ -68,20 +70,8 @@ def profile():
                                     .order_by(FarmerQuery.created_at.desc())\
                                     .limit(5).all()
     
-    # Get query statistics using fresh_user.id
-    total_queries = FarmerQuery.query.filter_by(farmer_id=fresh_user.id).count()
-    answered_queries = FarmerQuery.query.filter_by(farmer_id=fresh_user.id, status='answered').count()
-    pending_queries = FarmerQuery.query.filter_by(farmer_id=fresh_user.id, status='pending').count()
-    
-    # Calculate success rate
-    success_rate = round((answered_queries / total_queries * 100) if total_queries > 0 else 0, 1)
-    
-    stats = {
-        'total_queries': total_queries,
-        'answered_queries': answered_queries,
-        'pending_queries': pending_queries,
-        'success_rate': success_rate
-    }
+    # Query statistics: one farmer_stats row, or one grouped count (services/stats.py)
+    stats = query_stats(fresh_user.id)
     
     # Add cache-busting timestamp
     import time
@@ -230,22 +220,48 @@ def my_queries():
     """View user's queries and responses"""
     FarmerQuery = current_app.FarmerQuery
     
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-    
-    queries = FarmerQuery.query.filter_by(farmer_id=current_user.id)\
-                              .order_by(FarmerQuery.created_at.desc())\
-                              .paginate(page=page, per_page=per_page, error_out=False)
+    # Newest first, one index seek per page however far back (services/pagination.py);
+    # the list shows query.response_count, so no responses are loaded for it
+    try:
+        queries = keyset_page(FarmerQuery.query.filter_by(farmer_id=current_user.id),
+                              FarmerQuery.created_at, FarmerQuery.id,
+                              cursor=request.args.get('cursor'), per_page=10)
+    except InvalidCursor:
+        return redirect(url_for('dashboard.my_queries'))
     
     return render_template('dashboard/my_queries.html', queries=queries)
 
+@dashboard_bp.route('/api/queries')
+@login_required
+def api_queries():
+    """API endpoint: the user's queries with their responses, newest first, by cursor"""
+    FarmerQuery = current_app.FarmerQuery
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    try:
+        page = keyset_page(FarmerQuery.query.options(selectinload(FarmerQuery.responses))
+                                            .filter_by(farmer_id=current_user.id),
+                           FarmerQuery.created_at, FarmerQuery.id,
+                           cursor=request.args.get('cursor'), per_page=limit)
+    except InvalidCursor:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+    
+    return jsonify({
+        'status': 'success',
+        'queries': [query.to_dict() for query in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    })
+
 @dashboard_bp.route('/query/<int:query_id>')
 @login_required
 def view_query(query_id):
     """View specific query and its responses"""
     FarmerQuery = current_app.FarmerQuery
     
-    query = FarmerQuery.query.filter_by(id=query_id, farmer_id=current_user.id).first_or_404()
+    # Responses come with the page query instead of a lazy load from the template
+    query = FarmerQuery.query.options(selectinload(FarmerQuery.responses))\
+                             .filter_by(id=query_id, farmer_id=current_user.id).first_or_404()
     
     return render_template('dashboard/view_query.html', query=query)
 
@@ -1,13 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, current_app, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
 import json
-import requests
+
+from services.ai_client import AIServiceError, AIServiceUnavailable
+from services.answers import answer_fields, fallback_answer, record_ai_answer
+from services.uploads import find_upload, sha256_of, store_upload
 
 query_bp = Blueprint('query', __name__)
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @query_bp.route('/ask', methods=['GET', 'POST'])
 @login_required
 def ask_query():
@@ -32,15 +38,8 @@ def ask_query():
 
         if 'image_file' in request.files:
             image_file = request.files['image_file']
-            if image_file.filename != '' and current_app.allowed_file(image_file.filename):
-                filename = secure_filename(image_file.filename)
-                # Add timestamp to avoid filename conflicts
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-                filename = timestamp + filename
-                image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                image_file.save(image_path)
-                # Store relative path in database
-                image_path = filename
+            if image_file.filename == '' or not current_app.allowed_file(image_file.filename):
+                image_file = None
         
         if 'audio_file' in request.files:
             audio_file = request.files['audio_file']
@@ -51,13 +50,20 @@ def ask_query():
 
         # Enforce input exclusivity: either text OR image
         has_text = bool(query_text)
-        has_image = bool(image_path)
+        has_image = image_file is not None
         if has_text and has_image:
             flash('Please submit either text OR image, not both.', 'error')
             return render_template('query/ask.html')
         if not has_text and not has_image:
             flash('Please enter a question or upload an image.', 'error')
             return render_template('query/ask.html')
+
+        if has_image:
+            # Only now that the submission is accepted: stored once per distinct content,
+            # so a forwarded photo reuses the earlier file and analysis
+            upload, _ = store_upload(image_file)
+            # Store relative path in database
+            image_path = upload.path
         
         try:
             # Create new query
@@ -74,128 +80,13 @@ def ask_query():
             new_query.location = f"{current_user.village}, {current_user.district}" if current_user.village and current_user.district else None
             
             db.session.add(new_query)
-            db.session.flush()  # Get the query ID
-
-            # Call AI microservice
-            ai_base = current_app.config.get('AI_SERVICE_URL', 'http://localhost:5001')
-
-            if has_text:
-                payload = {
-                    'query_text': query_text,
-                    'language': language,
-                    'crop_type': crop_type,
-                    'farmer_location': new_query.location,
-                    'urgency': urgency,
-                    'image_path': None,
-                    'audio_path': None,
-                    'farmer_context': {
-                        'farm_size': getattr(current_user, 'farm_size', None),
-                        'farming_experience': getattr(current_user, 'farming_experience', None),
-                        'primary_crops': getattr(current_user, 'primary_crops', None),
-                        'district': getattr(current_user, 'district', None)
-                    }
-                }
-                try:
-                    r = requests.post(f"{ai_base}/ai/answer", json=payload, timeout=30)
-                    r.raise_for_status()
-                    ai = r.json()
-                    ai_text = ai.get('response_text') or 'No response generated.'
-                    model_used = ai.get('model_used') or 'gemini-pro-2.0'
-                    conf = ai.get('confidence_score') or None
-                    ptime = ai.get('processing_time') or None
-                    escalated = ai.get('escalated') or False
-                except Exception as ex:
-                    ai_text = 'AI service unavailable. Showing fallback advisory.' if language != 'ml' else 'AI സേവനം ലഭ്യമല്ല. താൽക്കാലിക നിർദ്ദേശം പ്രദർശിപ്പിക്കുന്നു.'
-                    model_used = 'fallback'
-                    conf = 0.3
-                    ptime = 0.0
-                    escalated = False
-            else:
-                # Image-only flow: send to Hugging Face via AI service
-                try:
-                    img_abs_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_path)
-                    with open(img_abs_path, 'rb') as f:
-                        files = {'image': (os.path.basename(img_abs_path), f, 'application/octet-stream')}
-                        r = requests.post(f"{ai_base}/ai/process-image", files=files, timeout=60)
-                    r.raise_for_status()
-                    data = r.json()
-                    if data.get('status') == 'success':
-                        label = data.get('disease_detected') or 'Unknown'
-                        score = data.get('confidence') or 0.0
-                        ai_text = (
-                            f"ചിത്ര വിശകലനം സൂചിപ്പിക്കുന്നത്: {label} (വിശ്വാസം {score:.2f})." if language == 'ml' 
-                            else f"Image analysis suggests: {label} (confidence {score:.2f})."
-                        )
-                        model_used = 'huggingface'
-                        conf = score
-                        ptime = None
-                        escalated = False
-                    elif data.get('status') == 'loading':
-                        ai_text = data.get('message') or (
-                            'മോഡൽ ലോഡാകുന്നു, ദയവായി കുറച്ച് നേരം കഴിഞ്ഞ് വീണ്ടും ശ്രമിക്കുക.' if language == 'ml' 
-                            else 'Model is loading, please retry shortly.'
-                        )
-                        model_used = 'huggingface'
-                        conf = 0.0
-                        ptime = None
-                        escalated = False
-                    else:
-                        ai_text = data.get('message') or (
-                            'ചിത്ര വിശകലനം ലഭ്യമല്ല.' if language == 'ml' else 'Image analysis unavailable.'
-                        )
-                        model_used = 'huggingface'
-                        conf = 0.0
-                        ptime = None
-                        escalated = False
-                except Exception as ex:
-                    ai_text = 'AI image service unavailable. Showing fallback advisory.' if language != 'ml' else 'AI ചിത്രം സർവീസ് ലഭ്യമല്ല. താൽക്കാലിക നിർദ്ദേശം പ്രദർശിപ്പിക്കുന്നു.'
-                    model_used = 'fallback'
-                    conf = 0.3
-                    ptime = 0.0
-                    escalated = False
-
-            ai_response = QueryResponse(
-                query_id=new_query.id,
-                response_text=ai_text,
-                response_type='ai',
-                language=language
-            )
-            ai_response.model_used = model_used
-            ai_response.confidence_score = conf
-            ai_response.processing_time = ptime
+            db.session.commit()
 
-            db.session.add(ai_response)
+            # Text answers are streamed into the query page when AI_STREAMING is on
+            # (see stream_answer); everything else is answered in the background
+            if not (has_text and current_app.config.get('AI_STREAMING')):
+                current_app.extensions['ai_jobs'].enqueue(new_query.id)
 
-            # Update query status and optionally escalate
-            if escalated:
-                new_query.status = 'escalated'
-                try:
-                    esc_payload = {
-                        'query_text': query_text,
-                        'metadata': {
-                            'farmer_id': current_user.id,
-                            'location': new_query.location,
-                            'crop_type': crop_type,
-                            'urgency': urgency
-                        }
-                    }
-                    er = requests.post(f"{ai_base}/ai/escalate", json=esc_payload, timeout=10)
-                    ticket = er.json().get('ticket_id') if er.ok else None
-                    # Store escalation note
-                    esc_note = QueryResponse(
-                        query_id=new_query.id,
-                        response_text=f"Escalated to local officer. Ticket: {ticket or 'pending'}",
-                        response_type='escalated',
-                        language=language
-                    )
-                    db.session.add(esc_note)
-                except Exception:
-                    pass
-            else:
-                new_query.status = 'answered'
-            
-            db.session.commit()
-            
             flash('Your query has been submitted successfully!', 'success')
             return redirect(url_for('dashboard.view_query', query_id=new_query.id))
             
@@ -206,6 +97,75 @@ def ask_query():
     
     return render_template('query/ask.html')
 
+@query_bp.route('/<int:query_id>/stream')
+@login_required
+def stream_answer(query_id):
+    """Relay the AI answer for a pending query as server-sent events, then store it"""
+    db = current_app.extensions['sqlalchemy']
+    FarmerQuery = current_app.FarmerQuery
+
+    query = FarmerQuery.query.filter_by(id=query_id, farmer_id=current_user.id).first_or_404()
+
+    # Claim the query so a reconnecting EventSource or a second tab does not answer it twice
+    claimed = db.session.execute(
+        db.update(FarmerQuery)
+        .where(FarmerQuery.id == query.id, FarmerQuery.status == 'pending')
+        .values(status='processing')
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return Response(_sse('done', {'status': query.status}), mimetype='text/event-stream')
+
+    fields = answer_fields(query, current_user)
+
+    def store(ai):
+        record_ai_answer(query, ai or fallback_answer(query.language))
+        db.session.commit()
+
+    def events():
+        try:
+            yield from current_app.ai_client.stream_answer(**fields)
+        except AIServiceError as e:
+            print(f"AI answer stream error: {e}")
+
+    def relay():
+        upstream = events()
+        ai = None
+        try:
+            for event, data in upstream:
+                if event == 'done':
+                    ai = data
+                    break
+                yield _sse(event, data)
+        except GeneratorExit:
+            # The farmer left the page mid-answer: finish reading so the answer is still saved
+            ai = next((data for event, data in upstream if event == 'done'), None)
+            store(ai)
+            raise
+        store(ai)
+        yield _sse('done', {'status': query.status})
+
+    return Response(
+        stream_with_context(relay()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@query_bp.route('/<int:query_id>/status')
+@login_required
+def query_status(query_id):
+    """Processing status of a query (polled by the query page while it is answered)"""
+    FarmerQuery = current_app.FarmerQuery
+
+    query = FarmerQuery.query.filter_by(id=query_id, farmer_id=current_user.id).first_or_404()
+
+    return jsonify({
+        'status': 'success',
+        'query_id': query.id,
+        'query_status': query.status,
+        'responses': query.response_count
+    })
+
 @query_bp.route('/api/submit-query', methods=['POST'])
 @login_required
 def api_submit_query():
@@ -228,80 +188,16 @@ def api_submit_query():
         new_query.urgency = data.get('urgency', 'medium')
         
         db.session.add(new_query)
-        db.session.flush()
-        
-        # Call AI microservice
-        ai_base = current_app.config.get('AI_SERVICE_URL', 'http://localhost:5001')
-        payload = {
-            'query_text': new_query.query_text,
-            'language': new_query.language,
-            'crop_type': new_query.crop_type,
-            'farmer_location': new_query.location,
-            'urgency': new_query.urgency
-        }
-        try:
-            r = requests.post(f"{ai_base}/ai/answer", json=payload, timeout=20)
-            r.raise_for_status()
-            ai = r.json()
-            ai_text = ai.get('response_text') or 'No response generated.'
-            model_used = ai.get('model_used') or 'unknown'
-            conf = ai.get('confidence_score') or None
-            ptime = ai.get('processing_time') or None
-            escalated = ai.get('escalated') or False
-        except Exception:
-            ai_text = 'AI service unavailable. Showing fallback advisory.'
-            model_used = 'fallback'
-            conf = 0.3
-            ptime = 0.0
-            escalated = False
-
-        QueryResponse = current_app.QueryResponse
-        ai_response = QueryResponse(
-            query_id=new_query.id,
-            response_text=ai_text,
-            response_type='ai',
-            language=new_query.language
-        )
-        ai_response.model_used = model_used
-        ai_response.confidence_score = conf
-        ai_response.processing_time = ptime
-        current_app.extensions['sqlalchemy'].session.add(ai_response)
-
-        if escalated:
-            new_query.status = 'escalated'
-            try:
-                esc_payload = {
-                    'query_text': new_query.query_text,
-                    'metadata': {
-                        'farmer_id': current_user.id,
-                        'location': new_query.location,
-                        'crop_type': new_query.crop_type,
-                        'urgency': new_query.urgency
-                    }
-                }
-                er = requests.post(f"{ai_base}/ai/escalate", json=esc_payload, timeout=10)
-                ticket = er.json().get('ticket_id') if er.ok else None
-                esc_note = QueryResponse(
-                    query_id=new_query.id,
-                    response_text=f"Escalated to local officer. Ticket: {ticket or 'pending'}",
-                    response_type='escalated',
-                    language=new_query.language
-                )
-                current_app.extensions['sqlalchemy'].session.add(esc_note)
-            except Exception:
-                pass
-        else:
-            new_query.status = 'answered'
+        db.session.commit()
+        current_app.extensions['ai_jobs'].enqueue(new_query.id)
 
-        response = {
+        return jsonify({
             'status': 'success',
             'query_id': new_query.id,
-            'message': 'AI response generated',
-            'escalated': escalated
-        }
-        
-        db.session.commit()
-        return jsonify(response)
+            'query_status': new_query.status,
+            'message': 'Query accepted; the AI response will be ready shortly',
+            'status_url': url_for('query.query_status', query_id=new_query.id)
+        }), 202
         
     except Exception as e:
         db.session.rollback()
@@ -364,13 +260,15 @@ def process_image():
     if 'image' not in request.files:
         return jsonify({'status': 'error', 'message': 'No image provided'}), 400
     image = request.files['image']
-    ai_base = current_app.config.get('AI_SERVICE_URL', 'http://localhost:5001')
-    files = {'image': (image.filename, image.stream, image.mimetype)}
+    # Same bytes as a stored, already analysed upload: answer without calling the AI service
+    upload = find_upload(sha256=sha256_of(image.stream))
+    if upload is not None and upload.analysis:
+        return jsonify(upload.get_analysis())
     try:
-        r = requests.post(f"{ai_base}/ai/process-image", files=files, timeout=30)
-        r.raise_for_status()
-        return jsonify(r.json())
-    except Exception as e:
+        return jsonify(current_app.ai_client.process_image(image.filename, image.stream, image.mimetype))
+    except AIServiceUnavailable:
+        return jsonify({'status': 'error', 'message': 'AI image service is temporarily unavailable'}), 503
+    except AIServiceError:
         return jsonify({'status': 'error', 'message': 'AI image service error'}), 500
 
 @query_bp.route('/voice-to-text', methods=['POST'])
@@ -381,12 +279,10 @@ def voice_to_text():
         return jsonify({'status': 'error', 'message': 'No audio provided'}), 400
     audio = request.files['audio']
     language = request.form.get('language', 'ml')
-    ai_base = current_app.config.get('AI_SERVICE_URL', 'http://localhost:5001')
-    files = {'audio': (audio.filename, audio.stream, audio.mimetype)}
-    data = {'language': language}
     try:
-        r = requests.post(f"{ai_base}/ai/voice-to-text", files=files, data=data, timeout=60)
-        r.raise_for_status()
-        return jsonify(r.json())
-    except Exception:
+        # werkzeug has spooled the upload to a temp file; stream it on instead of reading it into memory
+        return jsonify(current_app.ai_client.stream_voice_to_text(audio.stream, audio.mimetype, language, audio.filename))
+    except AIServiceUnavailable:
+        return jsonify({'status': 'error', 'message': 'AI voice service is temporarily unavailable'}), 503
+    except AIServiceError:
         return jsonify({'status': 'error', 'message': 'AI voice service error'}), 500
\ No newline at end of file
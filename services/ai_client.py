@@ -0,0 +1,255 @@
+"""HTTP client for the AI microservice (ai_service.py).
+
+One pooled ``requests.Session`` per worker process keeps connections to
+``AI_SERVICE_URL`` alive between calls. Connect and read timeouts are set
+separately: an unreachable service fails within seconds, while a slow answer
+still gets the full read timeout. Idempotent calls are retried on
+connection errors and 502/503/504 responses, with jittered exponential
+backoff. A read timeout is not retried: the service may still be working on
+the request (for an answer, a full Gemini generation), so a second attempt
+would only repeat that work. Escalation creates a ticket, so it is never
+retried.
+
+Each endpoint (answer, image, voice, escalate) sits behind its own circuit
+breaker. While the AI service keeps failing, calls raise
+AIServiceUnavailable straight away instead of waiting out timeouts, and
+callers fall back to their offline text.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+RETRY_STATUSES = {502, 503, 504}
+
+
+class AIServiceError(Exception):
+    """The AI service could not be reached or answered with an error"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AIServiceUnavailable(AIServiceError):
+    """The endpoint's circuit breaker is open; the call was not attempted"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message, 503)
+        self.retry_after = retry_after
+
+
+class AIServiceClient:
+    """Typed methods for the AI service endpoints, attached to the app as ``app.ai_client``"""
+
+    ENDPOINTS = ('answer', 'image', 'voice', 'escalate')
+
+    def __init__(self, app=None):
+        self.base_url = 'http://localhost:5001'
+        self.pool_size = 10
+        self.connect_timeout = 3.05
+        self.read_timeout = 30.0
+        self.media_read_timeout = 60.0
+        self.retries = 2
+        self.backoff = 0.3
+        self.breakers = {name: CircuitBreaker(name) for name in self.ENDPOINTS}
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.base_url = app.config.get('AI_SERVICE_URL', self.base_url).rstrip('/')
+        self.pool_size = app.config.get('AI_HTTP_POOL_SIZE', self.pool_size)
+        self.connect_timeout = app.config.get('AI_HTTP_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = app.config.get('AI_HTTP_READ_TIMEOUT', self.read_timeout)
+        self.media_read_timeout = app.config.get('AI_HTTP_MEDIA_READ_TIMEOUT', self.media_read_timeout)
+        self.retries = app.config.get('AI_HTTP_RETRIES', self.retries)
+        self.backoff = app.config.get('AI_HTTP_BACKOFF', self.backoff)
+        self.breakers = {
+            name: CircuitBreaker(
+                name,
+                failure_rate=app.config.get('AI_BREAKER_FAILURE_RATE', 0.5),
+                window=app.config.get('AI_BREAKER_WINDOW', 20),
+                min_calls=app.config.get('AI_BREAKER_MIN_CALLS', 5),
+                reset_timeout=app.config.get('AI_BREAKER_RESET_TIMEOUT', 30.0)
+            )
+            for name in self.ENDPOINTS
+        }
+        app.extensions['ai_client'] = self
+        app.ai_client = self
+
+    @property
+    def session(self):
+        # Pools must not be shared across fork(): rebuild the session in each worker process
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+                    self._pid = os.getpid()
+        return self._session
+
+    def _request(self, endpoint, method, path, idempotent=True, read_timeout=None, files=None, settle=True,
+                 **kwargs):
+        # settle=False: a response with good headers is not yet a success; the caller records the outcome
+        breaker = self.breakers[endpoint]
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            raise AIServiceUnavailable(f"{method} {path} skipped: {e}", e.retry_after)
+        try:
+            r = self._send(method, path, idempotent, read_timeout, files, **kwargs)
+        except AIServiceError as e:
+            # 4xx means we sent something wrong, not that the service is unwell
+            if e.status_code is None or e.status_code >= 500:
+                breaker.on_failure()
+            else:
+                breaker.on_success()
+            raise
+        except BaseException:
+            breaker.on_failure()
+            raise
+        if settle:
+            breaker.on_success()
+        return r
+
+    def _send(self, method, path, idempotent, read_timeout, files, **kwargs):
+        url = f"{self.base_url}{path}"
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        attempts = self.retries + 1 if idempotent else 1
+        # remember where uploads (multipart files or a streamed body) start so a retry can resend them
+        streams = [f[1] for f in (files or {}).values()]
+        if hasattr(kwargs.get('data'), 'read'):
+            streams.append(kwargs['data'])
+        offsets = [(s, s.tell()) for s in streams if hasattr(s, 'seek')]
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                if len(offsets) < len(streams):
+                    break  # an unseekable stream cannot be sent twice
+                for stream, offset in offsets:
+                    stream.seek(offset)
+            try:
+                r = self.session.request(method, url, timeout=timeout, files=files, **kwargs)
+            except requests.ConnectionError as e:
+                # includes ConnectTimeout: the request never reached the service
+                error = AIServiceError(f"{method} {path} failed: {e}")
+                continue
+            except requests.Timeout as e:
+                raise AIServiceError(f"{method} {path} timed out: {e}")
+            if r.status_code in RETRY_STATUSES:
+                error = AIServiceError(f"{method} {path} returned {r.status_code}", r.status_code)
+                r.close()
+                continue
+            if not r.ok:
+                raise AIServiceError(f"{method} {path} returned {r.status_code}", r.status_code)
+            return r
+        raise error
+
+    def worst_case_seconds(self, read_timeout=None, idempotent=True):
+        """Longest one call can take: every attempt waiting out both timeouts, plus the backoff sleeps"""
+        attempts = self.retries + 1 if idempotent else 1
+        backoff = sum(self.backoff * 2 ** (attempt - 1) * 1.5 for attempt in range(1, attempts))
+        return attempts * (self.connect_timeout + (read_timeout or self.read_timeout)) + backoff
+
+    def _json(self, endpoint, method, path, **kwargs):
+        r = self._request(endpoint, method, path, **kwargs)
+        try:
+            return r.json()
+        except ValueError:
+            raise AIServiceError(f"{method} {path} returned invalid JSON", r.status_code)
+
+    def health(self):
+        """Circuit breaker state per endpoint"""
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+
+    def answer(self, query_text, language='ml', crop_type=None, farmer_location=None, urgency=None,
+               farmer_context=None):
+        """POST /ai/answer; returns the AnswerResponse dict"""
+        payload = {
+            'query_text': query_text,
+            'language': language,
+            'crop_type': crop_type,
+            'farmer_location': farmer_location,
+            'urgency': urgency,
+            'farmer_context': farmer_context
+        }
+        return self._json('answer', 'POST', '/ai/answer', json=payload)
+
+    def stream_answer(self, query_text, language='ml', crop_type=None, farmer_location=None, urgency=None,
+                      farmer_context=None):
+        """POST /ai/answer/stream; yields (event, data) pairs as they arrive.
+
+        Connection failures are retried before the first byte; a stream that
+        breaks later raises AIServiceError from the iterator. The circuit
+        breaker counts the call once the stream ends: a success only if the
+        ``done`` event arrived.
+        """
+        payload = {
+            'query_text': query_text,
+            'language': language,
+            'crop_type': crop_type,
+            'farmer_location': farmer_location,
+            'urgency': urgency,
+            'farmer_context': farmer_context
+        }
+        breaker = self.breakers['answer']
+        r = self._request('answer', 'POST', '/ai/answer/stream', json=payload, stream=True,
+                          read_timeout=self.media_read_timeout, settle=False)
+        done = False
+        with r:
+            event = 'message'
+            try:
+                # chunk_size=None hands over each chunk as soon as it arrives
+                for line in r.iter_lines(chunk_size=None):
+                    line = line.decode('utf-8')
+                    if line.startswith('event:'):
+                        event = line[6:].strip()
+                    elif line.startswith('data:'):
+                        data = json.loads(line[5:])
+                        if event == 'done' and not done:
+                            # settled before handing it over: callers may stop reading at 'done'
+                            done = True
+                            breaker.on_success()
+                        yield event, data
+                    elif not line:
+                        event = 'message'
+            except (requests.RequestException, ValueError) as e:
+                raise AIServiceError(f"POST /ai/answer/stream broke off: {e}")
+            finally:
+                if not done:
+                    breaker.on_failure()
+
+    def process_image(self, filename, fileobj, mimetype='application/octet-stream'):
+        """POST /ai/process-image; returns the analysis dict (status, disease_detected, confidence, ...)"""
+        files = {'image': (filename, fileobj, mimetype)}
+        return self._json('image', 'POST', '/ai/process-image', files=files, read_timeout=self.media_read_timeout)
+
+    def voice_to_text(self, filename, fileobj, mimetype, language='ml'):
+        """POST /ai/voice-to-text; returns the transcription dict"""
+        files = {'audio': (filename, fileobj, mimetype)}
+        return self._json('voice', 'POST', '/ai/voice-to-text', files=files, data={'language': language},
+                          read_timeout=self.media_read_timeout)
+
+    def stream_voice_to_text(self, fileobj, mimetype, language='ml', filename=None):
+        """POST the audio as a raw streamed body to /ai/voice-to-text/stream; returns the transcription dict"""
+        return self._json('voice', 'POST', '/ai/voice-to-text/stream', data=fileobj,
+                          params={'language': language, 'filename': filename},
+                          headers={'Content-Type': mimetype or 'application/octet-stream'},
+                          read_timeout=self.media_read_timeout)
+
+    def escalate(self, query_text, metadata=None):
+        """POST /ai/escalate; not retried, since each call opens a ticket"""
+        payload = {'query_text': query_text, 'metadata': metadata or {}}
+        return self._json('escalate', 'POST', '/ai/escalate', json=payload, idempotent=False, read_timeout=10)
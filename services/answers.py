@@ -0,0 +1,130 @@
+from flask import current_app
+import os
+
+from services.ai_client import AIServiceError
+from services.images import analysis_path
+from services.uploads import find_upload
+
+
+def answer_fields(query, user):
+    """Arguments for AIServiceClient.answer / stream_answer"""
+    return {
+        'query_text': query.query_text,
+        'language': query.language,
+        'crop_type': query.crop_type,
+        'farmer_location': query.location,
+        'urgency': query.urgency,
+        'farmer_context': {
+            'farm_size': getattr(user, 'farm_size', None),
+            'farming_experience': getattr(user, 'farming_experience', None),
+            'primary_crops': getattr(user, 'primary_crops', None),
+            'district': getattr(user, 'district', None)
+        }
+    }
+
+
+def fallback_answer(language, image=False):
+    """Answer stored when the AI service could not be reached"""
+    if image:
+        text = 'AI image service unavailable. Showing fallback advisory.' if language != 'ml' else 'AI ചിത്രം സർവീസ് ലഭ്യമല്ല. താൽക്കാലിക നിർദ്ദേശം പ്രദർശിപ്പിക്കുന്നു.'
+    else:
+        text = 'AI service unavailable. Showing fallback advisory.' if language != 'ml' else 'AI സേവനം ലഭ്യമല്ല. താൽക്കാലിക നിർദ്ദേശം പ്രദർശിപ്പിക്കുന്നു.'
+    return {
+        'response_text': text,
+        'model_used': 'fallback',
+        'confidence_score': 0.3,
+        'processing_time': 0.0,
+        'escalated': False
+    }
+
+
+def analyse_image(image_path):
+    """AI image analysis for a stored upload; reuses the stored result for content seen before"""
+    upload = find_upload(path=image_path)
+    data = upload.get_analysis() if upload is not None else None
+    if data is not None:
+        return data
+    img_abs_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_path)
+    # send the downscaled copy made at upload time when there is one
+    small_path = os.path.join(current_app.config['UPLOAD_FOLDER'], analysis_path(image_path))
+    if os.path.exists(small_path):
+        img_abs_path = small_path
+    with open(img_abs_path, 'rb') as f:
+        data = current_app.ai_client.process_image(os.path.basename(img_abs_path), f)
+    # 'loading' and errors are transient; only keep real results (committed with the answer)
+    if upload is not None and data.get('status') == 'success':
+        upload.set_analysis(data)
+    return data
+
+
+def fetch_image_answer(image_path, language):
+    """Send an uploaded image to the AI service and phrase the result for the farmer"""
+    data = analyse_image(image_path)
+    if data.get('status') == 'success':
+        label = data.get('disease_detected') or 'Unknown'
+        score = data.get('confidence') or 0.0
+        ai_text = (
+            f"ചിത്ര വിശകലനം സൂചിപ്പിക്കുന്നത്: {label} (വിശ്വാസം {score:.2f})." if language == 'ml'
+            else f"Image analysis suggests: {label} (confidence {score:.2f})."
+        )
+        conf = score
+    elif data.get('status') == 'loading':
+        ai_text = data.get('message') or (
+            'മോഡൽ ലോഡാകുന്നു, ദയവായി കുറച്ച് നേരം കഴിഞ്ഞ് വീണ്ടും ശ്രമിക്കുക.' if language == 'ml'
+            else 'Model is loading, please retry shortly.'
+        )
+        conf = 0.0
+    else:
+        ai_text = data.get('message') or (
+            'ചിത്ര വിശകലനം ലഭ്യമല്ല.' if language == 'ml' else 'Image analysis unavailable.'
+        )
+        conf = 0.0
+    return {'response_text': ai_text, 'model_used': data.get('model') or 'huggingface', 'confidence_score': conf}
+
+
+def fetch_answer(query, user):
+    """Ask the AI service about a query (text or image); raises AIServiceError"""
+    if query.image_path:
+        return fetch_image_answer(query.image_path, query.language)
+    return current_app.ai_client.answer(**answer_fields(query, user))
+
+
+def record_ai_answer(query, ai):
+    """Store an AI service answer on the query and escalate it if the AI asked for that"""
+    db = current_app.extensions['sqlalchemy']
+    QueryResponse = current_app.QueryResponse
+
+    ai_response = QueryResponse(
+        query_id=query.id,
+        response_text=ai.get('response_text') or 'No response generated.',
+        response_type='ai',
+        language=query.language
+    )
+    ai_response.model_used = ai.get('model_used') or 'gemini-pro-2.0'
+    ai_response.confidence_score = ai.get('confidence_score') or None
+    ai_response.processing_time = ai.get('processing_time') or None
+    db.session.add(ai_response)
+
+    # Update query status and optionally escalate
+    if ai.get('escalated'):
+        query.status = 'escalated'
+        try:
+            esc = current_app.ai_client.escalate(query.query_text, {
+                'farmer_id': query.farmer_id,
+                'location': query.location,
+                'crop_type': query.crop_type,
+                'urgency': query.urgency
+            })
+            ticket = esc.get('ticket_id')
+        except AIServiceError:
+            ticket = None
+        # Store escalation note
+        esc_note = QueryResponse(
+            query_id=query.id,
+            response_text=f"Escalated to local officer. Ticket: {ticket or 'pending'}",
+            response_type='escalated',
+            language=query.language
+        )
+        db.session.add(esc_note)
+    else:
+        query.status = 'answered'
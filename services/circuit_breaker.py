@@ -0,0 +1,114 @@
+from collections import deque
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while the circuit is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"circuit '{name}' is open; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one downstream endpoint.
+
+    Outcomes of the last ``window`` calls are kept; once at least
+    ``min_calls`` are recorded and the share of failures reaches
+    ``failure_rate``, the circuit opens and calls fail immediately for
+    ``reset_timeout`` seconds. After that it goes half-open: up to
+    ``half_open_max_calls`` probe calls are let through, and the first probe
+    result decides between closing the circuit and opening it again.
+
+    Usage::
+
+        breaker.before_call()      # raises CircuitOpenError
+        try:
+            result = call()
+        except DownstreamError:
+            breaker.on_failure()
+            raise
+        breaker.on_success()
+    """
+
+    def __init__(self, name, failure_rate=0.5, window=20, min_calls=5, reset_timeout=30.0, half_open_max_calls=1):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_call(self):
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return
+            self.rejected += 1
+            retry_after = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(self.name, retry_after)
+
+    def on_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def on_failure(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if (self._state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def snapshot(self):
+        with self._lock:
+            state = self._current_state()
+            calls = len(self._outcomes)
+            failures = self._outcomes.count(False)
+            retry_after = self.reset_timeout - (time.monotonic() - self._opened_at) if state == OPEN else 0.0
+        return {
+            'state': state,
+            'recent_calls': calls,
+            'recent_failure_rate': round(failures / calls, 3) if calls else 0.0,
+            'retry_after': round(max(0.0, retry_after), 1),
+            'times_opened': self.opened,
+            'rejected': self.rejected
+        }
@@ -0,0 +1,86 @@
+"""Engine settings per database backend.
+
+SQLite is tuned on every new connection:
+
+- ``journal_mode=WAL``: readers no longer block the writer or each other,
+  and a commit appends to the log instead of rewriting the database file.
+- ``synchronous=NORMAL``: in WAL mode this fsyncs at checkpoints rather
+  than at every commit. A power cut can lose the last commits, but it
+  cannot corrupt the database.
+- ``busy_timeout``: a writer waits this long for the lock instead of
+  failing straight away with "database is locked".
+- ``mmap_size`` and ``cache_size``: reads come from memory-mapped pages and
+  a larger page cache.
+
+Server databases (MySQL, PostgreSQL) get a sized connection pool instead.
+``pool_pre_ping`` replaces connections the server dropped while idle, and
+``pool_recycle`` retires them before MySQL's ``wait_timeout`` would.
+Anything set explicitly in ``SQLALCHEMY_ENGINE_OPTIONS`` wins.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database URI"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    backend = url.get_backend_name()
+    options = {}
+    if backend == 'sqlite':
+        if url.database and url.database != ':memory:':
+            # the driver's own wait for the lock, in seconds; PRAGMA busy_timeout below matches it
+            options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}
+            options['pool_size'] = config['DB_POOL_SIZE']
+            options['max_overflow'] = config['DB_MAX_OVERFLOW']
+    else:
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+            pool_pre_ping=True
+        )
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def sqlite_pragmas(config):
+    """(name, value) pairs run on every new SQLite connection, in order"""
+    return [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('cache_size', config['SQLITE_CACHE_SIZE']),
+    ]
+
+
+class SQLiteTuning:
+    """Runs the SQLite PRAGMAs on each new connection of the app's SQLite engines"""
+
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.pragmas = []
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        self.pragmas = sqlite_pragmas(app.config)
+        app.extensions['sqlite_tuning'] = self
+        with app.app_context():
+            for engine in db.engines.values():
+                if engine.dialect.name == 'sqlite':
+                    event.listen(engine, 'connect', self._on_connect)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in self.pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    def settings(self, connection):
+        """Current values of the PRAGMAs on a SQLAlchemy connection (for checking they took)"""
+        return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name, _ in self.pragmas}
@@ -0,0 +1,130 @@
+"""Pillow preprocessing for uploaded photos.
+
+Phone photos arrive at 4-12 MB. Before one is stored it is turned upright
+from its EXIF orientation, downscaled and re-encoded (WebP by default), and
+two derived files are written next to it:
+
+- ``<name>_thumb<ext>``: small preview for the query list and detail pages
+- ``<name>_ai.jpg``: shortest side at the model's input size; this is what
+  goes to /ai/process-image instead of the full photo
+
+Decoding and resampling large images is CPU-heavy, so the work runs in a
+process pool and request threads only wait for the result.
+"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import tempfile
+import threading
+
+from PIL import Image, ImageOps
+
+FORMATS = {
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg')
+}
+
+
+def thumbnail_path(path):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_thumb{ext}"
+
+
+def analysis_path(path):
+    stem, _ = os.path.splitext(path)
+    return f"{stem}_ai.jpg"
+
+
+def _save(img, path, pil_format, **params):
+    # write then rename, so a concurrent upload of the same photo never sees half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            img.save(out, pil_format, **params)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def preprocess(src, dest_base, fmt='webp', quality=82, max_side=1600, analysis_size=256, thumb_side=320):
+    """Write ``dest_base + ext`` plus its thumbnail and analysis copies; returns (ext, mimetype).
+
+    Raises OSError (including PIL.UnidentifiedImageError) for files Pillow cannot read.
+    """
+    pil_format, ext, mimetype = FORMATS[fmt]
+    with Image.open(src) as img:
+        # JPEG can be decoded at 1/2..1/8 scale directly, far cheaper than a full decode + resize
+        img.draft('RGB', (max_side, max_side))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    _save(img, dest_base + ext, pil_format, quality=quality)
+
+    scale = analysis_size / min(img.size)
+    small = img.resize((round(img.width * scale), round(img.height * scale)), Image.LANCZOS) if scale < 1 else img
+    _save(small, dest_base + '_ai.jpg', 'JPEG', quality=90)
+
+    thumb = img.copy()
+    thumb.thumbnail((thumb_side, thumb_side), Image.LANCZOS)
+    _save(thumb, dest_base + '_thumb' + ext, pil_format, quality=quality)
+    return ext, mimetype
+
+
+class ImagePipeline:
+    """Process pool running preprocess(), attached to the app as ``app.extensions['image_pipeline']``"""
+
+    def __init__(self, app=None):
+        self.options = {}
+        self.workers = 2
+        self.timeout = 60.0
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = app.config.get('IMAGE_WORKERS', self.workers)
+        self.timeout = app.config.get('IMAGE_TIMEOUT', self.timeout)
+        self.options = {
+            'fmt': app.config.get('IMAGE_FORMAT', 'webp'),
+            'quality': app.config.get('IMAGE_QUALITY', 82),
+            'max_side': app.config.get('IMAGE_MAX_SIDE', 1600),
+            'analysis_size': app.config.get('IMAGE_ANALYSIS_SIZE', 256),
+            'thumb_side': app.config.get('IMAGE_THUMB_SIDE', 320)
+        }
+        app.extensions['image_pipeline'] = self
+
+    @property
+    def pool(self):
+        # spawn rather than fork: the app process runs threads (workers, request handlers)
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+        return self._pool
+
+    def process(self, src, dest_base):
+        """Preprocess ``src`` into ``dest_base`` + ext; returns (ext, mimetype), or None if it is not a usable image"""
+        try:
+            if self.workers <= 0:
+                return preprocess(src, dest_base, **self.options)
+            future = self.pool.submit(preprocess, src, dest_base, **self.options)
+            try:
+                return future.result(timeout=self.timeout)
+            except FuturesTimeout:
+                # TimeoutError is an OSError: handled here, before the fallback below
+                if future.cancel():
+                    print(f"Image preprocessing queue too slow, storing {src} as uploaded")
+                    return None
+                # already running: it will still write dest_base and its derived files, and the caller
+                # removes src once we return, so wait for it instead of storing the raw file beside them
+                return future.result()
+        except BrokenProcessPool as e:
+            self._pool = None
+            print(f"Image preprocessing pool broke on {src}: {e}")
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"Image preprocessing skipped for {src}: {e}")
+        return None
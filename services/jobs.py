@@ -0,0 +1,175 @@
+"""Background answering of farmer queries.
+
+Submitting a query only inserts the FarmerQuery (status ``pending``) and
+enqueues its id. A pool of worker threads claims the row with one atomic
+UPDATE (``pending`` -> ``processing``), so several app processes can share
+the table safely. The worker then calls the AI service once and stores the
+QueryResponse; the AI client's own retries are the only retry layer. While
+the AI service's circuit breaker is open, or if the call fails, the fallback
+advisory is stored straight away.
+
+The table is the source of truth. A periodic rescan re-enqueues rows left
+pending, e.g. a streamed answer whose page was never opened, and rows stuck
+in ``processing`` after a worker died. A claim is stale once it is older than
+AI_JOB_STALE_AFTER, which must exceed the longest an answer can take (checked
+at startup), and rows this process is still working on are never reset.
+"""
+from datetime import datetime, timedelta
+import queue
+import threading
+import time
+
+from services.ai_client import AIServiceError, AIServiceUnavailable
+from services.answers import fallback_answer, fetch_answer, record_ai_answer
+
+
+class QueryJobQueue:
+    """In-process queue of query ids with a fixed pool of worker threads"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._threads = []
+        self._owned = set()  # ids of rows claimed by this process's workers
+        self._owned_lock = threading.Lock()
+        self._last_scan = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['ai_jobs'] = self
+        self.check_stale_window(app)
+        # Workers start with the first request rather than at import, so the
+        # reloader's watcher process and CLI commands don't run them
+        app.before_request(self.start)
+
+    @staticmethod
+    def check_stale_window(app):
+        """Refuse to start if a claim could go stale while its answer is still being fetched"""
+        client = app.extensions['ai_client']
+        # an image answer waits on the media timeout; an escalation adds one unretried call
+        budget = (client.worst_case_seconds(max(client.read_timeout, client.media_read_timeout))
+                  + client.worst_case_seconds(10, idempotent=False))
+        if app.config['AI_JOB_STALE_AFTER'] <= budget:
+            raise RuntimeError(
+                f"AI_JOB_STALE_AFTER ({app.config['AI_JOB_STALE_AFTER']:.0f}s) must exceed the worst-case "
+                f"AI call time ({budget:.0f}s); raise it or lower the AI_HTTP timeouts/retries"
+            )
+
+    def start(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.app.config['AI_JOB_WORKERS']):
+                t = threading.Thread(target=self._run, name=f'ai-job-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def enqueue(self, query_id):
+        with self._queued_lock:
+            if query_id in self._queued:
+                return
+            self._queued.add(query_id)
+        self._queue.put(query_id)
+
+    def _run(self):
+        interval = self.app.config['AI_JOB_RESCAN_INTERVAL']
+        while True:
+            if time.monotonic() - self._last_scan >= interval:
+                self._rescan()
+            try:
+                query_id = self._queue.get(timeout=interval)
+            except queue.Empty:
+                continue
+            with self._queued_lock:
+                self._queued.discard(query_id)
+            try:
+                self.process(query_id)
+            except Exception as e:
+                print(f"AI job for query {query_id} failed: {e}")
+
+    def process(self, query_id):
+        """Answer one query if it is still pending; returns False if someone else took it"""
+        app = self.app
+        with app.app_context():
+            db = app.extensions['sqlalchemy']
+            FarmerQuery = app.FarmerQuery
+            # the claim also stamps updated_at (onupdate), which recover() measures staleness from
+            claimed = db.session.execute(
+                db.update(FarmerQuery)
+                .where(FarmerQuery.id == query_id, FarmerQuery.status == 'pending')
+                .values(status='processing')
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                return False
+
+            with self._owned_lock:
+                self._owned.add(query_id)
+            try:
+                query = db.session.get(FarmerQuery, query_id)
+                user = db.session.get(app.User, query.farmer_id)
+                ai = None
+                try:
+                    ai = fetch_answer(query, user)
+                except AIServiceUnavailable as e:
+                    # Circuit open: answer with the fallback now rather than hold a worker
+                    print(f"AI call for query {query_id} skipped: {e}")
+                except (AIServiceError, OSError) as e:
+                    print(f"AI call for query {query_id} failed: {e}")
+                try:
+                    record_ai_answer(query, ai or fallback_answer(query.language, image=bool(query.image_path)))
+                    db.session.commit()
+                except Exception:
+                    # Left in 'processing'; the rescan hands it back out once it is stale
+                    db.session.rollback()
+                    raise
+                return True
+            finally:
+                with self._owned_lock:
+                    self._owned.discard(query_id)
+
+    def _rescan(self):
+        if not self._scan_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self._last_scan < self.app.config['AI_JOB_RESCAN_INTERVAL']:
+                return
+            self._last_scan = time.monotonic()
+            with self.app.app_context():
+                query_ids = self.recover()
+            for query_id in query_ids:
+                self.enqueue(query_id)
+        except Exception as e:
+            print(f"AI job rescan failed: {e}")
+        finally:
+            self._scan_lock.release()
+
+    def recover(self):
+        """Reset abandoned 'processing' rows and list pending queries nobody is handling"""
+        app = self.app
+        db = app.extensions['sqlalchemy']
+        FarmerQuery = app.FarmerQuery
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=app.config['AI_JOB_STALE_AFTER'])
+        with self._owned_lock:
+            owned = list(self._owned)
+        reset = db.update(FarmerQuery).where(FarmerQuery.status == 'processing', FarmerQuery.updated_at < stale)
+        if owned:
+            reset = reset.where(FarmerQuery.id.notin_(owned))
+        db.session.execute(reset.values(status='pending'))
+        db.session.commit()
+        grace = now - timedelta(seconds=app.config['AI_JOB_PENDING_GRACE'])
+        rows = db.session.execute(
+            db.select(FarmerQuery.id)
+            .where(FarmerQuery.status == 'pending', FarmerQuery.created_at < grace, ~FarmerQuery.responses.any())
+            .order_by(FarmerQuery.created_at)
+        )
+        return [query_id for (query_id,) in rows]
@@ -0,0 +1,102 @@
+"""Keyset (cursor) pagination, newest first.
+
+``.paginate()`` skips earlier rows with OFFSET and counts them all for the
+page links, so page 300 costs 300 pages of reading. Here a page starts from
+the (created_at, id) of the row next to it instead: with an index on
+(..., created_at) that is one index seek and ``per_page + 1`` rows however
+deep the page is. ``id`` breaks ties between rows created in the same
+instant.
+
+Cursors are opaque URL-safe strings. A cursor only says where a page starts
+and which way it reads; the query it is applied to still carries its own
+filters (e.g. the farmer), so a hand-edited cursor can only move within
+those rows.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+NEWER = 'p'  # towards the start of the list
+OLDER = 'n'
+
+
+class InvalidCursor(ValueError):
+    """The cursor string could not be decoded"""
+
+
+def encode_cursor(created_at, row_id, direction=OLDER):
+    raw = json.dumps([created_at.isoformat(), row_id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id, direction) from a cursor string; raises InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id, direction = json.loads(raw)
+        if direction not in (NEWER, OLDER):
+            raise ValueError(direction)
+        return datetime.fromisoformat(created_at), int(row_id), direction
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+class KeysetPage:
+    """One page of rows plus cursors for its neighbours (None at either end)"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def to_dict(self):
+        return {'next_cursor': self.next_cursor, 'prev_cursor': self.prev_cursor}
+
+
+def keyset_page(query, created_col, id_col, cursor=None, per_page=10):
+    """Page of ``query`` ordered by (created_col, id_col) descending, starting after ``cursor``"""
+    if cursor:
+        created_at, row_id, direction = decode_cursor(cursor)
+    else:
+        created_at = row_id = None
+        direction = OLDER
+
+    if direction == OLDER:
+        if cursor:
+            # the plain created_at bound lets the index seek; the OR settles ties
+            query = query.filter(created_col <= created_at,
+                                 or_(created_col < created_at, and_(created_col == created_at, id_col < row_id)))
+        query = query.order_by(created_col.desc(), id_col.desc())
+    else:
+        query = query.filter(created_col >= created_at,
+                             or_(created_col > created_at, and_(created_col == created_at, id_col > row_id)))
+        query = query.order_by(created_col.asc(), id_col.asc())
+
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == NEWER:
+        rows.reverse()
+    if not rows:
+        return KeysetPage([])
+
+    def position(row, towards):
+        return encode_cursor(getattr(row, created_col.key), getattr(row, id_col.key), towards)
+
+    has_older = more if direction == OLDER else True
+    has_newer = bool(cursor) if direction == OLDER else more
+    return KeysetPage(
+        rows,
+        next_cursor=position(rows[-1], OLDER) if has_older else None,
+        prev_cursor=position(rows[0], NEWER) if has_newer else None
+    )
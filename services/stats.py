@@ -0,0 +1,207 @@
+"""Per-farmer query statistics for the profile page.
+
+With ``FARMER_STATS_CACHE`` on, the counts live in ``farmer_stats``, one row
+per farmer, so the profile page reads them with a single primary-key lookup
+however many queries the farmer has asked. The row is kept in step inside
+the transaction that writes the queries: a ``before_flush`` hook turns
+inserted, deleted and re-statused FarmerQuery objects into counter deltas
+and applies them with one ``UPDATE ... SET n = n + delta`` per farmer. A
+farmer without a row yet gets one from a grouped count of their queries.
+
+Pending and processing queries are counted together as open. The claim and
+recovery UPDATEs (services/jobs.py, routes/query.py) bypass the ORM, but
+they only move rows between those two statuses, so no counter changes.
+
+Without the cache, or for a farmer with no row, the counts come from one
+grouped COUNT/CASE query over the farmer's queries.
+
+``FarmerQuery.response_count`` is maintained the same way, always on, so
+query lists can show how many responses each query has without loading them.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.exc import IntegrityError
+
+COUNTERS = ('total_queries', 'open_queries', 'answered_queries', 'escalated_queries')
+STATUS_COUNTERS = {
+    'pending': 'open_queries',
+    'processing': 'open_queries',
+    'answered': 'answered_queries',
+    'escalated': 'escalated_queries',
+}
+
+
+def count_queries(executor, FarmerQuery, farmer_id=None):
+    """Counters from farmer_queries in one grouped pass: a dict for one farmer, else {farmer_id: dict}"""
+    columns = [func.count().label('total_queries')]
+    for counter in COUNTERS[1:]:
+        statuses = [s for s, c in STATUS_COUNTERS.items() if c == counter]
+        columns.append(func.count(case((FarmerQuery.status.in_(statuses), 1))).label(counter))
+    if farmer_id is not None:
+        row = executor.execute(select(*columns).where(FarmerQuery.farmer_id == farmer_id)).one()
+        return dict(row._mapping)
+    rows = executor.execute(select(FarmerQuery.farmer_id, *columns).group_by(FarmerQuery.farmer_id))
+    return {row.farmer_id: {c: row._mapping[c] for c in COUNTERS} for row in rows}
+
+
+def query_stats(farmer_id):
+    """Profile page numbers: total, answered and pending (open) queries and the success rate"""
+    db = current_app.extensions['sqlalchemy']
+    counts = None
+    if current_app.config.get('FARMER_STATS_CACHE'):
+        table = current_app.FarmerStats.__table__
+        row = db.session.execute(
+            select(*(table.c[c] for c in COUNTERS)).where(table.c.farmer_id == farmer_id)
+        ).first()
+        counts = dict(row._mapping) if row else None
+    if counts is None:
+        counts = count_queries(db.session, current_app.FarmerQuery, farmer_id)
+
+    total = counts['total_queries']
+    answered = counts['answered_queries']
+    return {
+        'total_queries': total,
+        'answered_queries': answered,
+        'pending_queries': counts['open_queries'],
+        'escalated_queries': counts['escalated_queries'],
+        'success_rate': round((answered / total * 100) if total > 0 else 0, 1)
+    }
+
+
+class FarmerStatsCounter:
+    """Maintains farmer_stats and FarmerQuery.response_count from each flush's pending changes"""
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['farmer_stats'] = self
+        session = app.extensions['sqlalchemy'].session
+        event.listen(session, 'before_flush', self._count_responses)
+        if app.config.get('FARMER_STATS_CACHE'):
+            event.listen(session, 'before_flush', self._before_flush)
+        app.cli.command('rebuild-farmer-stats')(self._rebuild_command)
+
+    def _count_responses(self, session, flush_context, instances):
+        FarmerQuery = self.app.FarmerQuery
+        QueryResponse = self.app.QueryResponse
+        deltas = Counter()
+        for objects, n in ((session.new, 1), (session.deleted, -1)):
+            for obj in objects:
+                if not isinstance(obj, QueryResponse):
+                    continue
+                query = obj.__dict__.get('query')  # only if already loaded
+                if query is not None and inspect(query).pending:
+                    # inserted in this same flush: the count goes in with the INSERT
+                    query.response_count = (query.response_count or 0) + n
+                elif obj.query_id or query is not None:
+                    deltas[obj.query_id or query.id] += n
+
+        table = FarmerQuery.__table__
+        for query_id, n in deltas.items():
+            if not n:
+                continue
+            session.connection().execute(
+                table.update().where(table.c.id == query_id)
+                .values(response_count=table.c.response_count + n, updated_at=table.c.updated_at)
+            )
+            loaded = session.identity_map.get(session.identity_key(FarmerQuery, query_id))
+            if loaded is not None:
+                session.expire(loaded, ['response_count'])
+
+    def _before_flush(self, session, flush_context, instances):
+        deltas = self._deltas(session)
+        if deltas:
+            self._apply(session.connection(), deltas)
+
+    def _deltas(self, session):
+        FarmerQuery = self.app.FarmerQuery
+        deltas = defaultdict(Counter)
+
+        def count(farmer_id, status, n):
+            counter = STATUS_COUNTERS.get(status)
+            if counter:
+                deltas[farmer_id][counter] += n
+
+        for obj in session.new:
+            if isinstance(obj, FarmerQuery):
+                deltas[obj.farmer_id]['total_queries'] += 1
+                count(obj.farmer_id, obj.status or 'pending', 1)
+        for obj in session.deleted:
+            if isinstance(obj, FarmerQuery):
+                deltas[obj.farmer_id]['total_queries'] -= 1
+                count(obj.farmer_id, self._stored_status(session, obj), -1)
+        for obj in session.dirty:
+            if isinstance(obj, FarmerQuery):
+                history = inspect(obj).attrs.status.history
+                if not history.has_changes():
+                    continue
+                # status was assigned without being loaded first: the row still holds the old one
+                old = history.deleted[0] if history.deleted else self._stored_status(session, obj)
+                count(obj.farmer_id, old, -1)
+                count(obj.farmer_id, obj.status, 1)
+
+        return {farmer_id: {c: n for c, n in delta.items() if n} for farmer_id, delta in deltas.items()
+                if any(delta.values())}
+
+    def _stored_status(self, session, obj):
+        FarmerQuery = self.app.FarmerQuery
+        return session.connection().execute(
+            select(FarmerQuery.status).where(FarmerQuery.id == inspect(obj).identity[0])
+        ).scalar()
+
+    def _apply(self, conn, deltas):
+        table = self.app.FarmerStats.__table__
+        now = datetime.utcnow()
+
+        def update(farmer_id, delta):
+            return conn.execute(
+                table.update()
+                .where(table.c.farmer_id == farmer_id)
+                .values(updated_at=now, **{c: table.c[c] + n for c, n in delta.items()})
+            ).rowcount
+
+        for farmer_id, delta in deltas.items():
+            if update(farmer_id, delta):
+                continue
+            # First write for this farmer: start from their existing queries (not yet including this flush)
+            counts = count_queries(conn, self.app.FarmerQuery, farmer_id)
+            for c, n in delta.items():
+                counts[c] += n
+            try:
+                # in a savepoint, so a duplicate-key failure doesn't abort the whole transaction (PostgreSQL)
+                with conn.begin_nested():
+                    conn.execute(table.insert().values(farmer_id=farmer_id, updated_at=now, **counts))
+            except IntegrityError:
+                # another request created the row first
+                update(farmer_id, delta)
+
+    def rebuild(self):
+        """Recount every farmer's row and every query's response_count (after running with the cache off)"""
+        db = self.app.extensions['sqlalchemy']
+        table = self.app.FarmerStats.__table__
+        counts = count_queries(db.session, self.app.FarmerQuery)
+        now = datetime.utcnow()
+        db.session.execute(table.delete())
+        if counts:
+            db.session.execute(table.insert(), [
+                {'farmer_id': farmer_id, 'updated_at': now, **row} for farmer_id, row in counts.items()
+            ])
+        queries = self.app.FarmerQuery.__table__
+        responses = self.app.QueryResponse.__table__
+        db.session.execute(queries.update().values(
+            response_count=select(func.count()).where(responses.c.query_id == queries.c.id).scalar_subquery(),
+            updated_at=queries.c.updated_at
+        ))
+        db.session.commit()
+        return len(counts)
+
+    def _rebuild_command(self):
+        """Recount farmer_stats and response counts from the tables."""
+        print(f"Rebuilt query stats for {self.rebuild()} farmers")
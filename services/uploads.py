@@ -0,0 +1,112 @@
+"""Content-addressed storage for uploaded files.
+
+Each distinct file is stored once under ``UPLOAD_FOLDER/cas/ab/cd/<sha256><ext>``
+(two levels of two-hex-digit shards keep directories small) and recorded in
+the ``uploads`` table. The SHA-256 is computed while the upload is streamed
+to a temporary file next to its final place; a duplicate is recognised when
+the stream ends and its temporary copy is dropped, so the same photo
+forwarded many times is kept and analysed only once.
+
+New images are downscaled and re-encoded (services/images.py) on the way in;
+the hash stays that of the bytes the farmer sent, so duplicates are caught
+before any of that work.
+"""
+import hashlib
+import os
+import tempfile
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 64 * 1024
+CAS_DIR = 'cas'
+
+
+def cas_path(digest, ext=''):
+    """Path of a content-addressed file relative to UPLOAD_FOLDER"""
+    return '/'.join((CAS_DIR, digest[:2], digest[2:4], digest + ext))
+
+
+def sha256_of(stream):
+    """Hash a seekable stream from its current position, leaving it where it started"""
+    start = stream.tell()
+    h = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        h.update(chunk)
+    stream.seek(start)
+    return h.hexdigest()
+
+
+def _extension(filename):
+    name = secure_filename(filename or '')
+    return os.path.splitext(name)[1].lower() if '.' in name else ''
+
+
+def store_upload(file_storage):
+    """Store an uploaded werkzeug FileStorage; returns (Upload, created).
+
+    Commits the ``uploads`` row, so call this before adding anything else to
+    the session. ``created`` is False when identical content was stored before.
+    """
+    db = current_app.extensions['sqlalchemy']
+    Upload = current_app.Upload
+    root = current_app.config['UPLOAD_FOLDER']
+    tmp_dir = os.path.join(root, CAS_DIR, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+                h.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        digest = h.hexdigest()
+
+        upload = Upload.query.filter_by(sha256=digest).first()
+        if upload is not None and os.path.exists(os.path.join(root, upload.path)):
+            return upload, False
+
+        if upload is not None:
+            # row outlived its file (e.g. uploads folder restored without cas/); put it back
+            upload.path, upload.mimetype = _place(tmp_path, root, upload.path, upload.mimetype)
+            db.session.commit()
+            return upload, False
+
+        rel_path, mimetype = _place(tmp_path, root, cas_path(digest, _extension(file_storage.filename)),
+                                    file_storage.mimetype)
+        upload = Upload(digest, rel_path, size, mimetype, file_storage.filename)
+        db.session.add(upload)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # the same file was stored concurrently; both wrote identical bytes to the same path
+            db.session.rollback()
+            return Upload.query.filter_by(sha256=digest).one(), False
+        return upload, True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _place(tmp_path, root, rel_path, mimetype=None):
+    """Move a new upload into the store, preprocessed if it is an image; returns (path, mimetype)"""
+    base = os.path.splitext(rel_path)[0]
+    os.makedirs(os.path.dirname(os.path.join(root, base)), exist_ok=True)
+    processed = current_app.extensions['image_pipeline'].process(tmp_path, os.path.join(root, base))
+    if processed is not None:
+        ext, mimetype = processed
+        return base + ext, mimetype
+    os.replace(tmp_path, os.path.join(root, rel_path))
+    return rel_path, mimetype
+
+
+def find_upload(path=None, sha256=None):
+    """Upload row by stored path or by content hash, or None (e.g. files saved before the CAS)"""
+    Upload = current_app.Upload
+    if sha256 is not None:
+        return Upload.query.filter_by(sha256=sha256).first()
+    return Upload.query.filter_by(path=path).first()
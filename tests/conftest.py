@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the app and the AI service away from instance/: throwaway database and knowledge index
+_tmp = tempfile.mkdtemp(prefix="krishi-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["KB_INDEX_PATH"] = os.path.join(_tmp, "kb_index")
+os.environ["AI_JOB_WORKERS"] = "0"
+os.environ["IMAGE_WORKERS"] = "0"
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The Flask app on a throwaway SQLite database built by the migrations"""
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from flask_migrate import upgrade
+    from app import app as flask_app
+
+    flask_app.config.update(TESTING=True, UPLOAD_FOLDER=os.path.join(_tmp, "uploads"))
+    with flask_app.app_context():
+        upgrade()
+    return flask_app
+
+
+@pytest.fixture
+def db(app):
+    """The app's db inside an app context; every table is emptied afterwards"""
+    database = app.extensions["sqlalchemy"]
+    with app.app_context():
+        yield database
+        database.session.rollback()
+        for table in reversed(database.metadata.sorted_tables):
+            database.session.execute(table.delete())
+        database.session.commit()
+        database.session.remove()
+
+
+@pytest.fixture
+def farmer(app, db):
+    user = app.User(username="farmer", phone="9000000000", full_name="Test Farmer", password="not-used")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, farmer):
+    """Test client logged in as ``farmer``"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(farmer.id)
+        session["_fresh"] = True
+    return client
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import ai_service
+
+
+def events(response):
+    out = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+@pytest.fixture
+def client():
+    return TestClient(ai_service.app)
+
+
+def fake_stream(pieces, complete):
+    async def astream(prompt):
+        for piece in pieces:
+            yield "gemini-test", piece
+        if complete:
+            yield "gemini-test", None
+    return astream
+
+
+def ask(client, question):
+    return events(client.post("/ai/answer/stream", json={"query_text": question, "language": "en"}))
+
+
+def test_complete_stream_is_cached(client, monkeypatch):
+    monkeypatch.setattr(ai_service.llm, "astream", fake_stream(["Spray ", "tricyclazole."], complete=True))
+    first = ask(client, "How do I stop blast in my paddy nursery?")
+    assert first[-1][0] == "done"
+    assert first[-1][1]["response_text"] == "Spray tricyclazole."
+    assert first[-1][1]["truncated"] is False
+
+    monkeypatch.setattr(ai_service.llm, "astream", fake_stream(["different"], complete=True))
+    again = ask(client, "How do I stop blast in my paddy nursery?")
+    assert again[-1][1]["response_text"] == "Spray tricyclazole."
+
+
+def test_truncated_stream_is_sent_but_not_cached(client, monkeypatch):
+    question = "Which fungicide for sheath blight in Kuttanad paddy?"
+    monkeypatch.setattr(ai_service.llm, "astream", fake_stream(["Use hexaconazole at"], complete=False))
+    cut = ask(client, question)
+    assert [e for e, _ in cut] == ["chunk", "done"]
+    assert cut[-1][1]["response_text"] == "Use hexaconazole at"
+    assert cut[-1][1]["truncated"] is True
+
+    monkeypatch.setattr(ai_service.llm, "astream", fake_stream(["Use hexaconazole at 2 ml/l."], complete=True))
+    full = ask(client, question)
+    assert full[-1][1]["response_text"] == "Use hexaconazole at 2 ml/l."
+    assert full[-1][1]["truncated"] is False
@@ -0,0 +1,49 @@
+import pytest
+
+import services.circuit_breaker as circuit_breaker
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def call(breaker, ok):
+    breaker.before_call()
+    if ok:
+        breaker.on_success()
+    else:
+        breaker.on_failure()
+
+
+def test_opens_once_the_failure_rate_is_reached(clock):
+    breaker = CircuitBreaker('ai', failure_rate=0.5, window=10, min_calls=4, reset_timeout=30)
+    for ok in (True, False, False):
+        call(breaker, ok)
+    assert breaker.state == CLOSED  # fewer than min_calls
+    call(breaker, False)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.before_call()
+    assert e.value.retry_after == 30
+    assert breaker.snapshot()['rejected'] == 1
+
+
+def test_half_open_probe_decides(clock):
+    breaker = CircuitBreaker('ai', min_calls=1, reset_timeout=30, half_open_max_calls=1)
+    call(breaker, False)
+    clock[0] += 30
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one probe at a time
+    breaker.on_failure()
+    assert breaker.state == OPEN and breaker.opened == 2
+
+    clock[0] += 30
+    call(breaker, True)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()['recent_calls'] == 1
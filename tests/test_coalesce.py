@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+from ai.coalesce import MicroBatcher, SingleFlight
+
+
+def test_single_flight_shares_one_call_per_key():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def main():
+        return await asyncio.gather(*(flights.do(k, lambda k=k: fetch(k)) for k in ["a", "a", "b", "a"]))
+
+    assert asyncio.run(main()) == ["A", "A", "B", "A"]
+    assert sorted(calls) == ["a", "b"]
+    assert flights.stats() == {"in_flight": 0, "started": 2, "shared": 2}
+
+
+def test_single_flight_call_survives_one_cancelled_waiter():
+    flights = SingleFlight()
+    done = []
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        done.append(True)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("q", fetch))
+        second = asyncio.ensure_future(flights.do("q", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "answer"
+    assert done == [True]
+
+
+def test_micro_batcher_groups_close_requests():
+    threads = set()
+
+    def double(items):
+        threads.add(threading.current_thread().name)
+        return [i * 2 for i in items]
+
+    batcher = MicroBatcher(double, window=0.01, max_batch=3)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8, 10, 12]
+    assert (batcher.batches, batcher.largest) == (3, 3)
+    assert threading.main_thread().name not in threads
+
+
+def test_micro_batcher_hands_a_batch_failure_to_every_caller():
+    def broken(items):
+        raise RuntimeError("index unavailable")
+
+    batcher = MicroBatcher(broken, window=0.01)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [str(r) for r in results] == ["index unavailable"] * 3
+    assert batcher.batches == 1
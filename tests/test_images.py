@@ -0,0 +1,45 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import services.images as images
+from services.images import ImagePipeline
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def preprocess(src, dest_base, **options):
+        calls.append(src)
+        release.wait(5)
+        return '.webp', 'image/webp'
+
+    monkeypatch.setattr(images, 'preprocess', preprocess)
+    pipeline = ImagePipeline()
+    pipeline.workers, pipeline.timeout = 1, 0.05
+    pipeline._pool, pipeline._pid = ThreadPoolExecutor(1), images.os.getpid()
+    yield pipeline, release, calls
+    release.set()
+    pipeline._pool.shutdown()
+
+
+def test_running_job_past_the_timeout_is_waited_for(pipeline):
+    pipeline, release, calls = pipeline
+    threading.Timer(0.2, release.set).start()
+    started = time.monotonic()
+    assert pipeline.process('a.jpg', 'cas/a') == ('.webp', 'image/webp')
+    assert time.monotonic() - started >= 0.2
+
+
+def test_queued_job_past_the_timeout_is_cancelled(pipeline):
+    pipeline, release, calls = pipeline
+    busy = pipeline.pool.submit(images.preprocess, 'busy.jpg', 'cas/busy')
+    assert pipeline.process('b.jpg', 'cas/b') is None
+    release.set()
+    busy.result()
+    pipeline.pool.shutdown()
+    assert calls == ['busy.jpg']
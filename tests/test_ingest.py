@@ -0,0 +1,62 @@
+import io
+
+from ai.ingest import ingest, iter_jsonl
+from ai.retrieval import Document, InMemoryRetriever
+
+
+def run(retriever, lines):
+    records = ((r, "test") for r in iter_jsonl(io.StringIO("\n".join(lines))))
+    return ingest(retriever, records, workers=1)
+
+
+def test_malformed_and_non_object_lines_are_skipped():
+    retriever = InMemoryRetriever([])
+    report = run(retriever, ['[]', '"x"', '3', '{bad', '{"text": "Banana wilt: remove and burn infected plants"}'])
+    assert (report.read, report.added, report.skipped) == (5, 1, 4)
+
+
+def test_same_id_twice_in_one_chunk_keeps_the_last():
+    retriever = InMemoryRetriever([])
+    report = run(retriever, [
+        '{"id": "a1", "text": "Old advice on coconut mites"}',
+        '{"id": "a1", "text": "Spray neem oil for coconut eriophyid mites"}',
+    ])
+    assert (report.added, report.duplicates, len(retriever)) == (1, 1, 1)
+    assert retriever.get_document("a1").text.startswith("Spray neem oil")
+
+
+def test_duplicate_text_is_not_added_again():
+    retriever = InMemoryRetriever([Document(id="seed", text="Rice blast: spray tricyclazole")])
+    report = run(retriever, ['{"id": "x", "text": "rice  blast: Spray tricyclazole"}'])
+    assert (report.added, report.duplicates) == (0, 1)
+
+
+def test_concurrent_saves_keep_both_writers_documents(tmp_path):
+    InMemoryRetriever([Document(id="seed", text="Rice blast: spray tricyclazole")]).save(tmp_path)
+    first = InMemoryRetriever.load(tmp_path)
+    second = InMemoryRetriever.load(tmp_path)
+    first.add_documents([Document(id="a", text="Banana sigatoka: mancozeb")])
+    second.add_documents([Document(id="b", text="Pepper foot rot: Bordeaux mixture")])
+    second.remove_document("seed")
+    first.save()
+    second.save()
+
+    saved = InMemoryRetriever.load(tmp_path)
+    assert sorted(d.id for d in saved.iter_documents()) == ["a", "b"]
+    assert saved.query("sigatoka on my banana", top_k=1)[0].id == "a"
+
+
+def test_refresh_swaps_vocabulary_scorer_and_segments_together(tmp_path):
+    InMemoryRetriever([Document(id="seed", text="Rice blast: spray tricyclazole")]).save(tmp_path)
+    reader = InMemoryRetriever.load(tmp_path)
+    writer = InMemoryRetriever.load(tmp_path)
+    writer.add_documents([Document(id="a", text="Banana sigatoka: mancozeb")])
+    writer.save()
+
+    before = reader._state
+    assert reader.refresh()
+    after = reader._state
+    assert after is not before
+    assert (reader.vocab, reader.scorer) == (after.vocab, after.scorer)
+    assert "a" in after.locations and "a" not in before.locations
+    assert reader.query("sigatoka on my banana", top_k=1)[0].id == "a"
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+
+import pytest
+
+import services.jobs as jobs
+from services.stats import count_queries, query_stats
+
+
+@pytest.fixture
+def job_queue(app):
+    return app.extensions['ai_jobs']
+
+
+def add_query(app, db, farmer, text='Leaf curl on chilli'):
+    query = app.FarmerQuery(farmer.id, text)
+    db.session.add(query)
+    db.session.commit()
+    return query.id
+
+
+def test_concurrent_workers_answer_a_query_once(app, db, farmer, job_queue, monkeypatch):
+    calls = []
+    ready = threading.Barrier(4)
+    monkeypatch.setattr(jobs, 'fetch_answer', lambda query, user: calls.append(query.id))
+    query_id = add_query(app, db, farmer)
+
+    def work():
+        ready.wait()
+        return job_queue.process(query_id)
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: work(), range(4)))
+
+    assert sorted(results) == [False, False, False, True]
+    assert calls == [query_id]
+    db.session.expire_all()
+    query = db.session.get(app.FarmerQuery, query_id)
+    assert (query.status, query.response_count, len(query.responses)) == ('answered', 1, 1)
+    assert query.responses[0].model_used == 'fallback'
+
+
+def test_stats_counters_follow_the_answer(app, db, farmer, job_queue, monkeypatch):
+    monkeypatch.setattr(jobs, 'fetch_answer', lambda query, user: None)
+    answered = add_query(app, db, farmer)
+    add_query(app, db, farmer, 'Yellowing coconut fronds')
+    job_queue.process(answered)
+
+    stats = query_stats(farmer.id)
+    counted = count_queries(db.session, app.FarmerQuery, farmer.id)
+    assert (stats['total_queries'], stats['answered_queries'], stats['pending_queries']) == (2, 1, 1)
+    assert (counted['total_queries'], counted['answered_queries'], counted['open_queries']) == (2, 1, 1)
+
+
+def test_recover_resets_stale_claims_except_those_this_process_holds(app, db, farmer, job_queue):
+    abandoned, working = add_query(app, db, farmer), add_query(app, db, farmer, 'Rice blast')
+    FarmerQuery = app.FarmerQuery
+    long_ago = datetime.utcnow() - timedelta(seconds=app.config['AI_JOB_STALE_AFTER'] + 60)
+    db.session.execute(
+        db.update(FarmerQuery).values(status='processing', created_at=long_ago, updated_at=long_ago)
+    )
+    db.session.commit()
+
+    job_queue._owned.add(working)
+    try:
+        assert job_queue.recover() == [abandoned]
+    finally:
+        job_queue._owned.discard(working)
+    statuses = dict(db.session.execute(db.select(FarmerQuery.id, FarmerQuery.status)).all())
+    assert statuses == {abandoned: 'pending', working: 'processing'}
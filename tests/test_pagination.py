@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.pagination import NEWER, OLDER, InvalidCursor, decode_cursor, encode_cursor, keyset_page
+
+
+def test_cursor_round_trip():
+    at = datetime(2024, 6, 1, 9, 30, 15, 123456)
+    cursor = encode_cursor(at, 42, NEWER)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (at, 42, NEWER)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-base64!', encode_cursor(datetime(2024, 1, 1), 1, 'x')])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_pages_walk_forward_and_back_across_ties(app, db, farmer):
+    FarmerQuery = app.FarmerQuery
+    start = datetime(2024, 6, 1)
+    for i in range(7):
+        query = FarmerQuery(farmer.id, f'query {i}')
+        # pairs share a timestamp, so the id has to break ties
+        query.created_at = start + timedelta(minutes=i // 2)
+        db.session.add(query)
+    db.session.commit()
+    expected = [q.id for q in db.session.execute(
+        db.select(FarmerQuery).order_by(FarmerQuery.created_at.desc(), FarmerQuery.id.desc())
+    ).scalars()]
+
+    def page(cursor=None):
+        return keyset_page(FarmerQuery.query.filter_by(farmer_id=farmer.id),
+                           FarmerQuery.created_at, FarmerQuery.id, cursor, per_page=3)
+
+    pages = [page()]
+    while pages[-1].has_next:
+        pages.append(page(pages[-1].next_cursor))
+    assert [[q.id for q in p.items] for p in pages] == [expected[0:3], expected[3:6], expected[6:]]
+    assert not pages[0].has_prev
+
+    back = page(pages[-1].prev_cursor)
+    assert [q.id for q in back.items] == expected[3:6]
+    assert decode_cursor(back.next_cursor)[2] == OLDER
+    first = page(back.prev_cursor)
+    assert [q.id for q in first.items] == expected[0:3]
+    assert not first.has_prev
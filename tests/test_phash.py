@@ -0,0 +1,61 @@
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from ai.phash import PerceptualCache, hamming, phash
+
+
+def photo(seed=1):
+    rnd = random.Random(seed)
+    img = Image.new("RGB", (320, 240), (90, 140, 60))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rnd.randrange(300), rnd.randrange(220)
+        draw.ellipse((x, y, x + rnd.randint(20, 120), y + rnd.randint(20, 90)),
+                     fill=tuple(rnd.randrange(256) for _ in range(3)))
+    return img
+
+
+def encode(img, fmt, **params):
+    buf = io.BytesIO()
+    img.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def test_recompressed_and_resized_photo_stays_close():
+    img = photo()
+    original = phash(encode(img, "PNG"))
+    shared = phash(encode(img.resize((160, 120)), "JPEG", quality=40))
+    other = phash(encode(img.transpose(Image.FLIP_LEFT_RIGHT), "PNG"))
+    assert hamming(original, shared) <= 8
+    assert hamming(original, other) > 8
+
+
+def test_lookup_finds_the_nearest_entry_like_a_linear_scan():
+    rnd = random.Random(3)
+    cache = PerceptualCache(max_distance=6, max_entries=1000)
+    stored = [rnd.getrandbits(64) for _ in range(500)]
+    for h in stored:
+        cache.store(h, {"hash": h})
+
+    for _ in range(300):
+        base = rnd.choice(stored)
+        probe = base
+        for bit in rnd.sample(range(64), rnd.randint(0, 9)):
+            probe ^= 1 << bit
+        best = min(hamming(probe, h) for h in stored)
+        found = cache.lookup(probe)
+        if best > 6:
+            assert found is None
+        else:
+            assert found is not None and found[1] == best == hamming(probe, found[0]["hash"])
+
+
+def test_evicted_entries_are_no_longer_found():
+    cache = PerceptualCache(max_distance=4, max_entries=2)
+    low, high, ones = (1 << 32) - 1, ((1 << 32) - 1) << 32, (1 << 64) - 1
+    for h in (low, high, ones):
+        cache.store(h, {"hash": h})
+    assert cache.lookup(low) is None
+    assert cache.lookup(ones ^ 0b11) == ({"hash": ones}, 2)
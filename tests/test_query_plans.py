@@ -0,0 +1,106 @@
+"""No statement the dashboard, query pages or background jobs run may scan
+farmer_queries or query_responses, or sort them in a temporary B-tree.
+
+The schema comes from the migrations and the statements from the app
+itself: the pages are rendered and the jobs run while every statement is
+EXPLAINed, with its own parameters, just before it executes.
+"""
+import random
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from services.pagination import encode_cursor
+from services.stats import count_queries
+
+QUERIES = 50_000
+FARMERS = 500
+BAD_PLAN = re.compile(r'^(SCAN (farmer_queries|query_responses)\b|USE TEMP B-TREE)')
+STATUSES = ('answered', 'answered', 'answered', 'pending', 'processing', 'escalated')
+
+
+def seed(db, farmer_id):
+    """Bulk-insert farmers, queries and one response per answered query, then ANALYZE"""
+    conn = db.session.connection().connection.driver_connection
+    now = datetime.utcnow()
+    conn.executemany(
+        "INSERT INTO users (id, username, phone, password_hash, full_name, preferred_language, is_active, "
+        "is_verified, created_at, updated_at) VALUES (?, ?, ?, 'x', ?, 'ml', 1, 0, ?, ?)",
+        ((i, f'seed{i}', f'8{i:09d}', f'Farmer {i}', now, now) for i in range(farmer_id + 1, farmer_id + FARMERS))
+    )
+    rng = random.Random(42)
+    responses = []
+
+    def queries():
+        for i in range(1, QUERIES + 1):
+            created = now - timedelta(minutes=QUERIES - i)
+            status = rng.choice(STATUSES)
+            if status in ('answered', 'escalated'):
+                responses.append((i, created))
+            yield (i, farmer_id + rng.randrange(FARMERS), f'question {i}', 'text', 'ml', 'medium', status,
+                   created, created)
+
+    conn.executemany(
+        "INSERT INTO farmer_queries (id, farmer_id, query_text, query_type, language, urgency, status, "
+        "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        queries()
+    )
+    conn.executemany(
+        "INSERT INTO query_responses (query_id, response_text, response_type, language, created_at, updated_at) "
+        "VALUES (?, 'answer', 'ai', 'ml', ?, ?)",
+        ((qid, created, created) for qid, created in responses)
+    )
+    conn.commit()
+    conn.execute('ANALYZE')
+
+
+@contextmanager
+def explained(engine):
+    """(statement, plan steps) for each statement on the two big tables executed inside the block"""
+    plans = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not re.search(r'\b(farmer_queries|query_responses)\b', statement):
+            return
+        if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            return
+        cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        plans.append((' '.join(statement.split()), [row[-1] for row in cursor.fetchall()]))
+
+    event.listen(engine, 'before_cursor_execute', explain)
+    try:
+        yield plans
+    finally:
+        event.remove(engine, 'before_cursor_execute', explain)
+
+
+@pytest.fixture
+def plans(app, db, farmer, client):
+    seed(db, farmer.id)
+    FarmerQuery = app.FarmerQuery
+    answered = db.session.execute(
+        db.select(FarmerQuery).where(FarmerQuery.farmer_id == farmer.id, FarmerQuery.status == 'answered')
+        .order_by(FarmerQuery.created_at.desc()).offset(20)
+    ).scalars().first()
+    response_id = answered.responses[0].id
+    older = encode_cursor(answered.created_at, answered.id)
+    newer = encode_cursor(answered.created_at, answered.id, 'p')
+
+    with explained(db.engine) as plans:
+        for url in ('/dashboard/profile', '/dashboard/my-queries', f'/dashboard/my-queries?cursor={older}',
+                    f'/dashboard/my-queries?cursor={newer}', f'/dashboard/api/queries?cursor={older}',
+                    f'/dashboard/query/{answered.id}', f'/query/{answered.id}/status'):
+            assert client.get(url).status_code == 200, url
+        client.post(f'/query/feedback/{response_id}', data={'rating': '5'})
+        count_queries(db.session, FarmerQuery, farmer.id)  # profile stats without the farmer_stats row
+        app.extensions['ai_jobs'].recover()
+    return plans
+
+
+def test_no_full_scans(plans):
+    assert len(plans) >= 10
+    bad = [(statement, plan) for statement, plan in plans if any(BAD_PLAN.match(step) for step in plan)]
+    assert not bad, '\n\n'.join(f'{statement}\n  ' + '\n  '.join(plan) for statement, plan in bad)
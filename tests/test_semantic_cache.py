@@ -0,0 +1,25 @@
+from ai.cache import SemanticCache
+from ai.retrieval import InMemoryRetriever, load_seed_knowledge
+
+CONTEXT = ("rice", "palakkad")
+
+
+def cache_with(question):
+    retriever = InMemoryRetriever(load_seed_knowledge())
+    cache = SemanticCache(threshold=0.85)
+    ids, weights = retriever.embed(question)
+    cache.store("en", "k", ids, weights, CONTEXT, {"response_text": "Spray tricyclazole."})
+    return retriever, cache
+
+
+def test_near_duplicate_hits():
+    retriever, cache = cache_with("How do I control rice blast?")
+    ids, weights = retriever.embed("Rice blast: how do I control it?")
+    hit = cache.lookup("en", ids, weights, CONTEXT)
+    assert hit is not None and hit[0]["response_text"] == "Spray tricyclazole."
+
+
+def test_question_differing_in_unknown_words_misses():
+    retriever, cache = cache_with("How do I control rice blast?")
+    ids, weights = retriever.embed("Is rice blast dangerous for my cows?")
+    assert cache.lookup("en", ids, weights, CONTEXT) is None
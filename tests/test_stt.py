@@ -0,0 +1,44 @@
+import asyncio
+import struct
+
+import numpy as np
+import pytest
+
+from ai.stt import NullEngine, UnsupportedAudio, WavDecoder, transcribe
+
+
+def wav(samples, channels=1, rate=16000, block=None, bits=16):
+    data = np.asarray(samples, dtype="<i2").tobytes()
+    block = channels * bits // 8 if block is None else block
+    fmt = struct.pack("<HHIIHH", 1, channels, rate, rate * block, block, bits)
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", len(data)) + data
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def run(audio):
+    async def chunks():
+        yield audio
+    return asyncio.run(transcribe(NullEngine(), chunks(), "en", decode=True))
+
+
+def test_stereo_8khz_is_downmixed_and_resampled():
+    pcm = WavDecoder().feed(wav([1000, 3000] * 800, channels=2, rate=8000))
+    out = np.frombuffer(pcm, dtype="<i2")
+    assert abs(len(out) - 1600) <= 1
+    assert (out == 2000).all()
+
+
+@pytest.mark.parametrize("header", [
+    {"rate": 0},
+    {"rate": 1},
+    {"channels": 0, "block": 2},
+    {"block": 0},
+    {"channels": 2, "block": 2},
+])
+def test_corrupt_header_is_unsupported_audio(header):
+    with pytest.raises(UnsupportedAudio):
+        run(wav([0] * 320, **header))
+
+
+def test_valid_wav_reports_its_duration():
+    assert run(wav([0] * 8000))["duration"] == 0.5
@@ -0,0 +1,44 @@
+import io
+import os
+
+from PIL import Image
+
+
+def png(colour=(40, 160, 60)):
+    buf = io.BytesIO()
+    Image.new('RGB', (64, 48), colour).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def ask(client, data, image=None):
+    if image is not None:
+        data = dict(data, image_file=(io.BytesIO(image), 'leaf.png', 'image/png'))
+    return client.post('/query/ask', data=data, content_type='multipart/form-data')
+
+
+def stored_files(app):
+    root = os.path.join(app.config['UPLOAD_FOLDER'], 'cas')
+    return [os.path.join(d, f) for d, _, files in os.walk(root) for f in files if os.sep + 'tmp' not in d]
+
+
+def test_image_query_is_stored_once_per_content(app, db, client):
+    photo = png()
+    first = ask(client, {'query_type': 'image'}, photo)
+    second = ask(client, {'query_type': 'image'}, photo)
+    assert first.status_code == second.status_code == 302
+
+    uploads = db.session.execute(db.select(app.Upload)).scalars().all()
+    queries = db.session.execute(db.select(app.FarmerQuery)).scalars().all()
+    assert len(uploads) == 1 and len(queries) == 2
+    assert {q.image_path for q in queries} == {uploads[0].path}
+    assert os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], uploads[0].path))
+
+
+def test_rejected_text_and_image_submission_stores_nothing(app, db, client):
+    before = stored_files(app)
+    response = ask(client, {'query_text': 'What is wrong with this leaf?'}, png((200, 40, 40)))
+    assert response.status_code == 200
+    assert b'either text OR image' in response.data
+    assert db.session.execute(db.select(db.func.count()).select_from(app.Upload)).scalar() == 0
+    assert db.session.execute(db.select(db.func.count()).select_from(app.FarmerQuery)).scalar() == 0
+    assert stored_files(app) == before
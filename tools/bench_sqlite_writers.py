@@ -0,0 +1,144 @@
+"""Concurrent-writer benchmark for the SQLite settings in services/database.py.
+
+Each profile runs in a fresh process against a fresh database file. The
+engine options are fixed when the app is imported, so a profile cannot be
+switched in place. Writer threads, each with its own app context and
+session, submit farmer queries through the ORM, so the farmer_stats and
+response-count hooks run as well. Every fourth submission also reads the
+farmer's profile stats. The benchmark reports throughput, commit latency
+and "database is locked" failures.
+
+    python tools/bench_sqlite_writers.py
+    python tools/bench_sqlite_writers.py --threads 16 --ops 200
+
+Profiles:
+    baseline  SQLite and driver defaults: rollback journal, synchronous=FULL, 5 s busy wait
+    tuned     the app's defaults: WAL, synchronous=NORMAL, 15 s busy wait, mmap, 64 MB cache
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROFILES = {
+    'baseline': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_BUSY_TIMEOUT': '5000',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_CACHE_SIZE': '-2000',
+    },
+    'tuned': {},
+}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run_profile(threads, ops, farmers):
+    """Child process: seed, hammer, print one JSON line of results"""
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from sqlalchemy.exc import OperationalError
+    from app import app, db
+    from services.stats import query_stats
+    app.config['AI_JOB_WORKERS'] = 0
+    User = app.User
+    FarmerQuery = app.FarmerQuery
+
+    with app.app_context():
+        db.create_all()
+        for i in range(1, farmers + 1):
+            db.session.add(User(username=f'farmer{i}', phone=f'9{i:09d}', full_name=f'Farmer {i}', password='x'))
+        db.session.commit()
+
+    barrier = threading.Barrier(threads + 1)
+    results = []
+
+    def writer(index):
+        latencies = []
+        errors = 0
+        with app.app_context():
+            barrier.wait()
+            for n in range(ops):
+                farmer_id = (index * ops + n) % farmers + 1
+                start = time.perf_counter()
+                try:
+                    query = FarmerQuery(farmer_id=farmer_id, query_text=f'question {index}-{n}',
+                                        query_type='text', language='en')
+                    db.session.add(query)
+                    db.session.commit()
+                    if n % 4 == 0:
+                        query_stats(farmer_id)
+                except OperationalError:
+                    db.session.rollback()
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+            db.session.remove()
+        results.append((latencies, errors))
+
+    workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [l for lat, _ in results for l in lat]
+    errors = sum(e for _, e in results)
+    print(json.dumps({
+        'ops': len(latencies),
+        'errors': errors,
+        'seconds': elapsed,
+        'ops_per_s': (len(latencies) - errors) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'max_ms': max(latencies) * 1000,
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=100, help='submissions per thread')
+    parser.add_argument('--farmers', type=int, default=50)
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_profile(args.threads, args.ops, args.farmers)
+        return 0
+
+    print(f'{args.threads} writer threads x {args.ops} submissions, {args.farmers} farmers')
+    print(f"{'profile':<10} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'locked':>7}")
+    for profile in args.profiles:
+        workdir = tempfile.mkdtemp(prefix='bench-sqlite-')
+        env = dict(os.environ, **PROFILES[profile])
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', '--threads', str(args.threads),
+             '--ops', str(args.ops), '--farmers', str(args.farmers)],
+            env=env, capture_output=True, text=True
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith('{')]
+        if proc.returncode or not lines:
+            print(f'{profile:<10} failed:\n{proc.stderr[-2000:]}')
+            continue
+        r = json.loads(lines[-1])
+        print(f"{profile:<10} {r['ops_per_s']:>8.0f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['max_ms']:>8.1f} {r['errors']:>7}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Check how many SQL statements each dashboard page runs.
+
+Seeds a throwaway SQLite database with one farmer and a few pages of
+answered queries, renders the pages through the test client and compares
+the number of statements each one executes with EXPECTED. It exits
+non-zero on any difference, so a template that starts lazy-loading a
+relationship per row (an N+1) fails here instead of in production.
+
+    python tools/count_statements.py
+    python tools/count_statements.py -v    # print the statements
+"""
+import argparse
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from services.pagination import encode_cursor
+
+# page -> statements per render; the first is always Flask-Login loading the user
+EXPECTED = {
+    'profile': 3,       # user, recent queries, farmer_stats row
+    'my_queries': 2,    # user, page of queries (keyset; response_count is a column)
+    'api_queries': 3,   # user, page of queries, their responses (selectinload)
+    'view_query': 3,    # user, query, its responses (selectinload)
+    'query_status': 2,  # user, query
+}
+
+
+@contextmanager
+def count_statements(engine):
+    """Collect the SQL statements executed on ``engine`` inside the block"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def seed(app, db, queries, responses):
+    User = app.User
+    FarmerQuery = app.FarmerQuery
+    QueryResponse = app.QueryResponse
+    farmer = User(username='farmer', phone='9000000000', full_name='Test Farmer', password='not-used')
+    db.session.add(farmer)
+    db.session.commit()
+    for i in range(queries):
+        query = FarmerQuery(farmer_id=farmer.id, query_text=f'question {i}', query_type='text', language='en')
+        query.status = 'answered'
+        query.responses = [
+            QueryResponse(query_id=None, response_text=f'answer {j}', response_type='ai', language='en')
+            for j in range(responses)
+        ]
+        db.session.add(query)
+    db.session.commit()
+    # second page of the newest-first list starts after the tenth newest query
+    tenth = FarmerQuery.query.order_by(FarmerQuery.created_at.desc(), FarmerQuery.id.desc()).offset(9).first()
+    return farmer.id, query.id, encode_cursor(tenth.created_at, tenth.id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=25, help='queries to seed (more than one page)')
+    parser.add_argument('--responses', type=int, default=2, help='responses per query')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='statements-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'statements.db')}"
+    import config
+    config.DevelopmentConfig.SQLALCHEMY_ECHO = False
+    from app import app, db
+    # no background answering while pages are counted
+    app.config['AI_JOB_WORKERS'] = 0
+
+    with app.app_context():
+        db.create_all()
+        farmer_id, query_id, cursor = seed(app, db, args.queries, args.responses)
+        engine = db.engine
+
+    pages = {
+        'profile': '/dashboard/profile',
+        'my_queries': f'/dashboard/my-queries?cursor={cursor}',
+        'api_queries': f'/dashboard/api/queries?cursor={cursor}',
+        'view_query': f'/dashboard/query/{query_id}',
+        'query_status': f'/query/{query_id}/status',
+    }
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(farmer_id)
+        session['_fresh'] = True
+
+    failures = 0
+    for name, url in pages.items():
+        with count_statements(engine) as statements:
+            status = client.get(url).status_code
+        ok = status == 200 and len(statements) == EXPECTED[name]
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {len(statements)} statements (expected {EXPECTED[name]}), HTTP {status}")
+        if args.verbose or not ok:
+            for statement in statements:
+                print('       ' + ' '.join(statement.split())[:160])
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())